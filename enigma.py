@@ -15,7 +15,7 @@ from enigma.api.enigma_api import \
     EnigmaAPI  # pylint: disable=no-name-in-module
 from enigma.core.components import (  # pylint: disable=no-name-in-module
     DEFAULT_LAYOUT, HISTORICAL)
-from enigma.interface.cli import cli
+from enigma.interface.cli import batch, cli, mapped, stream
 from enigma.interface.gui import load_views
 from enigma.interface.gui.gui import runtime
 from enigma.utils.cfg_handler import load_config
@@ -161,6 +161,22 @@ if __name__ == "__main__":
         (("-p", "--preview"), dict(help="Runs a sample cli command")),
         (("-v", "--verbose"), dict(help="Turns on verbose logging messages")),
         (("-s", "--silent"), dict(help="Turns off all prints except cli output")),
+        (
+            ("--stream",),
+            dict(
+                help="encrypts input from --in or stdin in chunks and writes them to "
+                "--out or stdout as they are encrypted (cli mode)",
+                dest="stream",
+            ),
+        ),
+        (
+            ("--mmap",),
+            dict(
+                help="encrypts the --in file trough memory maps and writes it to --out, "
+                "the file is encrypted in place if --out is not supplied (cli mode)",
+                dest="mmap",
+            ),
+        ),
     )
     for arg in ARGUMENT_DATA:
         PARSER.add_argument(*arg[0], **arg[1], action="store_true", default=False)
@@ -255,6 +271,42 @@ if __name__ == "__main__":
             ("-m", "--message"),
             dict(help="text for encryption in cli mode", nargs=1, dest="message"),
         ),
+        (
+            ("--in",),
+            dict(
+                help="file to read text from in stream and mmap modes",
+                nargs=1,
+                dest="input",
+            ),
+        ),
+        (
+            ("--out",),
+            dict(
+                help="file to write encrypted text to in stream and mmap modes "
+                "or JSONL results to in batch mode",
+                nargs=1,
+                dest="output",
+            ),
+        ),
+        (
+            ("--batch",),
+            dict(
+                help="encrypts JSONL jobs (settings in the saved config format plus "
+                "a \"message\" key) and writes JSONL results to --out or stdout",
+                nargs=1,
+                metavar="JOBS",
+            ),
+        ),
+        (
+            ("--workers",),
+            dict(
+                help="number of processes to split encryption between in cli and "
+                "batch modes",
+                type=int,
+                default=None,
+                metavar="N",
+            ),
+        ),
     )
 
     for arg in CLI_DATA:
@@ -366,7 +418,19 @@ if __name__ == "__main__":
 
     logging.info("Starting Enigma...")
 
-    if ARGS.cli:  # Command line mode
+    if ARGS.batch:  # Batch mode, settings are supplied by each job
+        logging.info("Loading in batch mode...")
+        batch(ARGS)
+
+    elif ARGS.cli and ARGS.mmap:  # Command line memory-mapped file mode
+        logging.info("Loading in CLI mmap mode with settings:\n%s...", str(ENIGMA_API))
+        mapped(ENIGMA_API, ARGS)
+
+    elif ARGS.cli and ARGS.stream:  # Command line stream mode
+        logging.info("Loading in CLI stream mode with settings:\n%s...", str(ENIGMA_API))
+        stream(ENIGMA_API, ARGS)
+
+    elif ARGS.cli:  # Command line mode
         logging.info("Loading in CLI mode with settings:\n%s...", str(ENIGMA_API))
 
         # If stdin exists, load text from it
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""Turing-Welchman bombe. A crib placed against the ciphertext links pairs of
+letters trough the scrambler at known key presses, forming a menu. For each
+wheel order and start position a plugboard hypothesis of one menu letter is
+propagated trough the menu and the diagonal board, positions where it does not
+spread to every hypothesis are stops. Like the original machine the bombe only
+turns the fast rotor along the crib and assumes ring settings at their default,
+so a middle rotor turnover inside the crib hides the correct position."""
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import permutations, product
+
+from enigma.api.enigma_api import EnigmaAPI
+from enigma.core import ALPHABET
+from enigma.core.components import HISTORICAL
+from enigma.core.keystream import Keystream
+
+
+def menu(crib, ciphertext, offset=0, charset=ALPHABET):
+    """Links crib letters to the ciphertext letters they encrypted to
+    :param crib: {str} Suspected plaintext
+    :param ciphertext: {str} Intercepted message
+    :param offset: {int} Index of the ciphertext letter the crib starts at
+    :param charset: {str} Character set of the machine
+    :return: {[(int, int, int), ...]} Charset indexes of both letters and the
+             index of the key press that links them, for every crib letter
+    """
+    if not isinstance(offset, int) or offset < 0 or offset + len(crib) > len(ciphertext):
+        raise ValueError("Crib of length %d does not fit the ciphertext at offset %s!"
+                         % (len(crib), offset))
+
+    indexes = {letter: i for i, letter in enumerate(charset)}
+    edges = []
+    for press, (plain, cipher) in enumerate(zip(crib, ciphertext[offset:]), offset):
+        if plain == cipher:
+            raise ValueError("Crib letter '%s' can't encrypt to itself at offset %d!"
+                             % (plain, press))
+        try:
+            edges.append((indexes[plain], indexes[cipher], press))
+        except KeyError as err:
+            raise ValueError("This Enigma instance does not have a '%s' key!" % err.args[0])
+
+    return edges
+
+
+def register(edges, size):
+    """Returns the menu letter with the most links in the largest connected part
+    of the menu, hypotheses are tested on it (the bombe's test register)
+    :param edges: {[(int, int, int), ...]} Menu as returned by menu
+    :param size: {int} Charset length
+    """
+    neighbours = [[] for _ in range(size)]
+    for first, second, _ in edges:
+        neighbours[first].append(second)
+        neighbours[second].append(first)
+
+    best, seen = [], set()
+    for letter in range(size):
+        if letter in seen or not neighbours[letter]:
+            continue
+        part, stack = [], [letter]
+        seen.add(letter)
+        while stack:
+            current = stack.pop()
+            part.append(current)
+            for other in neighbours[current]:
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        if len(part) > len(best):
+            best = part
+
+    if not best:
+        raise ValueError("The menu has no links!")
+    return max(best, key=lambda letter: (len(neighbours[letter]), -letter))
+
+
+def wheel_orders(model, reflectors=None):
+    """Returns all reflector and rotor combinations that fit into a model, thin
+    rotors (without turnover notches) only fit the leftmost slot of 4 rotor models
+    :param model: {str} Enigma model
+    :param reflectors: {[str, str, ...]} Reflector labels, all reflectors
+                                        except the rewirable UKW-D if None
+    :return: {[(str, (str, str, ...)), ...]} Reflector and rotor labels
+    """
+    data = HISTORICAL[model]
+    if reflectors is None:
+        reflectors = [reflector["label"] for reflector in data["reflectors"]
+                      if reflector["label"] != "UKW-D"]
+
+    thin = [rotor["label"] for rotor in data["rotors"] if not rotor.get("turnover")]
+    normal = [rotor["label"] for rotor in data["rotors"] if rotor.get("turnover")]
+    if data["rotor_n"] == 4:
+        orders = [(first,) + rest for first in thin for rest in permutations(normal, 3)]
+    else:
+        orders = list(permutations(normal + thin, 3))
+
+    return [(reflector, rotors) for reflector in reflectors for rotors in orders]
+
+
+def reflector_positions(enigma_api):
+    """Returns all positions the reflector can be set to
+    :param enigma_api: {EnigmaAPI}
+    :return: {[int, ...] or [None]} Reflector positions, [None] if the reflector
+                                   can't be rotated
+    """
+    try:
+        enigma_api.reflector_position()
+    except ValueError:
+        return [None]
+    return list(range(1, len(enigma_api.charset()) + 1))
+
+
+def _closure(links, bases, table, test, value, full):
+    """Propagates a plugboard hypothesis trough the menu and the diagonal board
+    :param links: {[[(int, int), ...], ...]} Linked letter and key press of
+                                            every menu link of every letter
+    :param bases: {[int, ...]} Offset of the scrambler table of every key press
+    :param table: {array} Keystream table of the wheel order
+    :param test: {int} Test register letter
+    :param value: {int} Hypothetical plugboard partner of the test register
+    :param full: {int} Bit mask of all charset indexes
+    :return: {[int, ...]} Bit mask of live hypotheses of every letter or None
+             if all hypotheses of the test register are live
+    """
+    live = [0] * len(links)
+    live[test] = 1 << value
+    stack = [(test, value)]
+    while stack:
+        letter, value = stack.pop()
+        if not live[value] >> letter & 1:  # Diagonal board
+            live[value] |= 1 << letter
+            stack.append((value, letter))
+        for other, press in links[letter]:
+            mapped = table[bases[press] + value]
+            if not live[other] >> mapped & 1:
+                live[other] |= 1 << mapped
+                stack.append((other, mapped))
+        if live[test] == full:
+            return None
+    return live
+
+
+def _stops(links, bases, table, test, size):
+    """Returns consistent hypotheses of a single start position
+    :return: {[[int, ...], ...]} Live hypotheses bit masks of each stop
+    """
+    full = (1 << size) - 1
+    live = _closure(links, bases, table, test, 0, full)
+    if live is None:
+        return []
+
+    # Hypotheses of the test register fall into separate sets, each set holding
+    # a single hypothesis is consistent
+    stops, remaining = [], full
+    while live is not None:
+        if bin(live[test]).count("1") == 1:
+            stops.append(live)
+        remaining &= ~live[test]
+        if not remaining:
+            break
+        value = (remaining & -remaining).bit_length() - 1
+        live = _closure(links, bases, table, test, value, full)
+    return stops
+
+
+def scan(model, reflector, rotors, edges):
+    """Tests every start position of a single wheel order, rotatable reflectors
+    are tested in every position too
+    :param model: {str} Enigma model
+    :param reflector: {str} Reflector label
+    :param rotors: {[str, str, ...]} Rotor labels
+    :param edges: {[(int, int, int), ...]} Menu as returned by menu
+    :return: {[dict, ...]} Stops with the reflector, rotors, start positions,
+             plugboard pairs implied by the stop (in the Plugboard.pairs format)
+             and the reflector position if the reflector is rotatable
+    """
+    enigma_api = EnigmaAPI(model, reflector, list(rotors), position_buffer=0)
+    enigma = enigma_api.enigma()
+    charset = enigma.charset()
+    size = len(charset)
+
+    links = [[] for _ in range(size)]
+    for first, second, press in edges:
+        links[first].append((second, press))
+        links[second].append((first, press))
+    test = register(edges, size)
+    presses = range(max(press for _, _, press in edges) + 1)
+
+    stops = []
+    static = len(enigma.offsets()) - 3
+    for reflector_position in reflector_positions(enigma_api):
+        if reflector_position is not None:
+            enigma_api.reflector_position(reflector_position)
+
+        for static_offsets in product(range(size), repeat=static):
+            enigma.offsets(static_offsets + (0, 0, 0))  # Stepping rotors are all in the tables
+            table = Keystream(enigma).table()
+
+            for state in range(size ** 3):
+                slow, right = divmod(state, size)
+                # Only the fast rotor turns, key press i is made after i + 1 steps
+                bases = [(slow * size + (right + press + 1) % size) * size for press in presses]
+                for live in _stops(links, bases, table, test, size):
+                    stop = _stop(enigma, reflector, rotors,
+                                 static_offsets + divmod(slow, size) + (right,), live)
+                    if reflector_position is not None:
+                        stop["reflector_position"] = enigma_api.reflector_position()
+                    stops.append(stop)
+    return stops
+
+
+def _stop(enigma, reflector, rotors, offsets, live):
+    """Formats a stop to a dictionary"""
+    enigma.offsets(offsets)
+
+    charset = enigma.charset()
+    pairs = set()
+    for letter, mask in enumerate(live):
+        if mask and not mask & (mask - 1):  # Exactly one live hypothesis
+            partner = mask.bit_length() - 1
+            if partner != letter:
+                pairs.add("".join(sorted(charset[letter] + charset[partner])))
+
+    return {
+        "reflector": reflector,
+        "rotors": list(rotors),
+        "positions": list(enigma.positions()),
+        "plug_pairs": sorted(pairs),
+    }
+
+
+def _scan(args):
+    """Process pool entry point of scan"""
+    return scan(*args)
+
+
+def run_bombe(crib, ciphertext, model, offset=0, reflectors=None, orders=None, workers=None):
+    """Runs the bombe over every start position of every wheel order and yields
+    stops in wheel order, wheel orders are spread across worker processes
+    :param crib: {str} Suspected plaintext
+    :param ciphertext: {str} Intercepted message
+    :param model: {str} Enigma model
+    :param offset: {int} Index of the ciphertext letter the crib starts at
+    :param reflectors: {[str, str, ...]} Reflector labels to try, see wheel_orders
+    :param orders: {[(str, [str, str, ...]), ...]} Reflector and rotor labels to
+                                                  try, all wheel orders if None
+    :param workers: {int} Number of worker processes, 1 runs in this process
+    """
+    if model not in HISTORICAL:
+        raise ValueError("Enigma model '%s' does not exist!" % model)
+
+    edges = menu(crib, ciphertext, offset, HISTORICAL[model]["charset"])
+    orders = wheel_orders(model, reflectors) if orders is None else orders
+    jobs = [(model, reflector, rotors, edges) for reflector, rotors in orders]
+
+    if workers == 1:
+        results = map(_scan, jobs)
+        yield from (stop for stops in results for stop in stops)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for stops in executor.map(_scan, jobs):
+            yield from stops
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""Crib placement. An Enigma never encrypts a letter to itself, so a crib can
+only sit at offsets of the ciphertext where none of its letters lines up with
+the same ciphertext letter."""
+
+import re
+
+from enigma.core import vectorized
+
+
+def _codes(text):
+    """Returns character codes of a text as an unsigned integer array
+    :param text: {str}
+    :return: {np.ndarray}
+    """
+    np = vectorized.np
+    try:
+        return np.frombuffer(text.encode("latin-1"), dtype=np.uint8)
+    except UnicodeEncodeError:
+        return np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+
+
+def _admissible(crib, codes, positions=None):
+    """Returns a mask of offsets at which no crib letter meets itself
+    :param crib: {str} Crib
+    :param codes: {np.ndarray} Character codes of the ciphertext
+    :param positions: {dict} Cache of ciphertext positions of each character
+                             code, shared between cribs of the same ciphertext
+    :return: {np.ndarray} Boolean mask with an item per offset the crib fits at
+    """
+    np = vectorized.np
+    positions = {} if positions is None else positions
+    count = codes.size - len(crib) + 1
+    if count <= 0:
+        return np.zeros(0, dtype=bool)
+
+    # Each occurrence of a crib letter in the ciphertext rules out one offset,
+    # marking them all is far cheaper than comparing the crib at every offset
+    clash = np.zeros(codes.size, dtype=bool)
+    for i, letter in enumerate(crib):
+        code = ord(letter)
+        if code not in positions:
+            positions[code] = np.flatnonzero(codes == code)
+        found = positions[code]
+        clash[found[np.searchsorted(found, i):] - i] = True
+    return ~clash[:count]
+
+
+def crib_offsets(crib, ciphertext):
+    """Returns all offsets of the ciphertext the crib can be placed at
+    :param crib: {str} Suspected plaintext
+    :param ciphertext: {str} Intercepted message
+    :return: {np.ndarray or [int, int, ...]} Admissible offsets in ascending order
+    """
+    if not crib:
+        raise ValueError("Crib can't be empty!")
+
+    np = vectorized.np
+    if np is not None:
+        return np.flatnonzero(_admissible(crib, _codes(ciphertext)))
+
+    # Lookahead matches overlap, so the regex engine visits every offset
+    pattern = "".join("[^%s]" % re.escape(letter) for letter in crib)
+    return [match.start() for match in re.finditer("(?=%s)" % pattern, ciphertext, re.DOTALL)]
+
+
+def corpus_offsets(cribs, messages):
+    """Returns admissible offsets of several cribs in every message of a corpus,
+    messages are scanned together as a single text
+    :param cribs: {[str, str, ...]} Suspected plaintexts
+    :param messages: {[str, str, ...]} Intercepted messages
+    :return: {dict} Admissible (message index, offset) pairs of each crib as
+             two arrays (or lists without NumPy) of equal length
+    """
+    messages = list(messages)
+    np = vectorized.np
+    if np is None:
+        results = {}
+        for crib in cribs:
+            found = [(index, offset) for index, message in enumerate(messages)
+                     for offset in crib_offsets(crib, message)]
+            results[crib] = ([index for index, _ in found], [offset for _, offset in found])
+        return results
+
+    lengths = np.array([len(message) for message in messages], dtype=np.int64)
+    starts = np.cumsum(lengths) - lengths
+    codes = _codes("".join(messages))
+
+    # Message of every ciphertext letter and number of letters left until its end
+    owner = np.repeat(np.arange(len(messages), dtype=np.uint32), lengths)
+    room = np.repeat(starts + lengths, lengths) - np.arange(codes.size)
+
+    results, positions = {}, {}
+    for crib in cribs:
+        if not crib:
+            raise ValueError("Crib can't be empty!")
+        fits = _admissible(crib, codes, positions)
+        fits &= room[:fits.size] >= len(crib)  # Not crossing into the next message
+        offsets = np.flatnonzero(fits)
+        index = owner[offsets]
+        results[crib] = (index, (offsets - starts[index]).astype(np.uint32))
+    return results
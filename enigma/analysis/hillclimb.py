@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Plugboard recovery by hill climbing. With the rotors fixed, the scrambler
+permutation of every key press is computed once and plugboard candidates are
+only applied on top of them. Changing a pair affects just the key presses
+whose ciphertext or scrambler output is one of the rewired letters, so each
+candidate is scored by recomputing the n-grams around those key presses."""
+
+from concurrent.futures import ProcessPoolExecutor
+from random import Random
+
+from enigma.analysis.scrambler import Scrambler
+
+
+class PlugboardClimber:
+    """Hill climber over plugboard pairs for a single rotor setting"""
+
+    def __init__(self, api_config, ciphertext, ngrams):
+        """
+        :param api_config: {dict} Settings in the EnigmaAPI.get_config format,
+                                  plugboard pairs and Uhr are ignored
+        :param ciphertext: {str} Intercepted message
+        :param ngrams: {NgramTable} N-gram log-probabilities to score decrypts with
+        """
+        scrambler = Scrambler(api_config, len(ciphertext))
+        charset = ngrams.charset()
+        if scrambler.size() != len(charset):
+            raise ValueError("N-gram table charset does not match the Enigma charset!")
+
+        indexes = {letter: i for i, letter in enumerate(charset)}
+        try:
+            self._cipher = [indexes[letter] for letter in ciphertext]
+        except KeyError as err:
+            raise ValueError("This Enigma instance does not have a '%s' key!" % err.args[0])
+
+        self._charset = charset
+        self._size = size = scrambler.size()
+        self._scrambler = scrambler.table()
+        self._ngrams = ngrams
+
+        # Key presses of every ciphertext letter never change
+        self._by_cipher = [[] for _ in range(size)]
+        for press, index in enumerate(self._cipher):
+            self._by_cipher[index].append(press)
+
+        self.__plug = list(range(size))
+        self.__middle, self.__output, self.__windows = [], [], []
+        self.__by_middle = []
+
+    def _reset(self, pairs):
+        """Sets the plugboard and decrypts the whole message from scratch
+        :param pairs: {[(int, int), ...]} Connected charset indexes
+        """
+        size, table = self._size, self._scrambler
+        self.__plug = plug = list(range(size))
+        for first, second in pairs:
+            plug[first], plug[second] = second, first
+
+        self.__middle = [table[press * size + plug[index]]
+                         for press, index in enumerate(self._cipher)]
+        self.__output = [plug[middle] for middle in self.__middle]
+        self.__by_middle = [set() for _ in range(size)]
+        for press, middle in enumerate(self.__middle):
+            self.__by_middle[middle].add(press)
+
+        n, code = self._ngrams.n(), self._ngrams.code
+        table = self._ngrams.table()
+        self.__windows = [table[code(self.__output[start:start + n])]
+                          for start in range(len(self._cipher) - n + 1)]
+
+    def score(self):
+        """Returns the score of the current decrypt"""
+        return sum(self.__windows)
+
+    def pairs(self):
+        """Returns current plugboard pairs in the Plugboard.pairs format"""
+        return [self._charset[first] + self._charset[second]
+                for first, second in enumerate(self.__plug) if first < second]
+
+    def _try(self, first, second, max_pairs):
+        """Connects two letters (or disconnects them if already connected) and
+        keeps the change if it improves the score
+        :param first: {int} Charset index
+        :param second: {int} Charset index
+        :param max_pairs: {int} Maximum number of pairs
+        :return: {bool} True if the change was kept
+        """
+        plug = self.__plug
+        if plug[first] == second:
+            changes = {first: first, second: second}
+        else:
+            changes = {plug[first]: plug[first], plug[second]: plug[second],
+                       first: second, second: first}
+            pair_count = sum(1 for i, j in enumerate(plug) if i < j)
+            pair_count += 1 - (plug[first] != first) - (plug[second] != second)
+            if pair_count > max_pairs:
+                return False
+
+        size, table, cipher = self._size, self._scrambler, self._cipher
+        middle, output = self.__middle, self.__output
+
+        # Key presses entering or leaving the scrambler trough a rewired letter
+        affected = set()
+        for letter in changes:
+            affected.update(self._by_cipher[letter])
+            affected.update(self.__by_middle[letter])
+
+        new_middle, new_output = {}, {}
+        for press in affected:
+            index = cipher[press]
+            routed = table[press * size + changes.get(index, plug[index])]
+            new_middle[press] = routed
+            new_output[press] = changes.get(routed, plug[routed])
+
+        n, windows = self._ngrams.n(), self.__windows
+        ngrams = self._ngrams.table()
+        starts = set()
+        for press in affected:
+            starts.update(range(max(press - n + 1, 0), min(press + 1, len(windows))))
+
+        new_windows, delta = {}, 0.0
+        for start in starts:
+            code = 0
+            for press in range(start, start + n):
+                code = code * size + new_output.get(press, output[press])
+            new_windows[start] = ngrams[code]
+            delta += ngrams[code] - windows[start]
+
+        if delta <= 1e-9:
+            return False
+
+        for letter, partner in changes.items():
+            plug[letter] = partner
+        for press, routed in new_middle.items():
+            self.__by_middle[middle[press]].discard(press)
+            self.__by_middle[routed].add(press)
+            middle[press] = routed
+            output[press] = new_output[press]
+        for start, value in new_windows.items():
+            windows[start] = value
+        return True
+
+    def climb(self, pairs=(), max_pairs=10):
+        """Climbs from select plugboard pairs until no single change improves
+        the score
+        :param pairs: {["AB", "CD", ...]} Starting plugboard pairs
+        :param max_pairs: {int} Maximum number of plugboard pairs
+        :return: {([str, str, ...], float)} Pairs and score of the local maximum
+        """
+        indexes = {letter: i for i, letter in enumerate(self._charset)}
+        self._reset([(indexes[pair[0]], indexes[pair[1]]) for pair in pairs])
+
+        improved = True
+        while improved:
+            improved = False
+            for first in range(self._size):
+                for second in range(first + 1, self._size):
+                    if self._try(first, second, max_pairs):
+                        improved = True
+
+        return self.pairs(), self.score()
+
+
+def _restart(args):
+    """Runs a single hill climb from a random plugboard (process pool entry point)
+    :return: {([str, str, ...], float)} Pairs and score of the local maximum
+    """
+    api_config, ciphertext, ngrams, max_pairs, seed = args
+    climber = PlugboardClimber(api_config, ciphertext, ngrams)
+
+    pairs = []
+    if seed is not None:  # The first climb starts from an empty plugboard
+        rng = Random(seed)
+        letters = rng.sample(ngrams.charset(), 2 * rng.randint(0, max_pairs))
+        pairs = [first + second for first, second in zip(letters[::2], letters[1::2])]
+    return climber.climb(pairs, max_pairs)
+
+
+def climb_plugboard(api_config, ciphertext, ngrams, max_pairs=10, restarts=8, workers=None,
+                    seed=None):
+    """Recovers plugboard pairs for fixed rotor settings, the climb is repeated
+    from random plugboards and restarts are spread across worker processes
+    :param api_config: {dict} Settings in the EnigmaAPI.get_config format,
+                              plugboard pairs and Uhr are ignored
+    :param ciphertext: {str} Intercepted message
+    :param ngrams: {NgramTable} N-gram log-probabilities to score decrypts with,
+                                tables loaded from a file are mapped again by
+                                each worker process instead of being copied
+    :param max_pairs: {int} Maximum number of plugboard pairs
+    :param restarts: {int} Number of climbs, the first starts from an empty plugboard
+    :param workers: {int} Number of worker processes, 1 climbs in this process
+    :param seed: {int} Seed of the random starting plugboards
+    :return: {([str, str, ...], float)} Best pairs found (in the
+             Plugboard.pairs format) and their score
+    """
+    if not isinstance(max_pairs, int) or not 0 <= max_pairs <= 13:
+        raise ValueError("Maximum number of plugboard pairs must be in range 0 - 13!")
+    if not isinstance(restarts, int) or restarts < 1:
+        raise ValueError("Number of restarts must be a positive integer!")
+
+    rng = Random(seed)
+    jobs = [(api_config, ciphertext, ngrams, max_pairs, None if i == 0 else rng.getrandbits(32))
+            for i in range(restarts)]
+
+    if workers == 1 or restarts == 1:
+        results = list(map(_restart, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_restart, jobs))
+
+    return max(results, key=lambda result: result[1])
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Ciphertext-only rotor search. Without the plugboard a decrypt under the right
+wheel order and start positions still shares many letters with the plaintext,
+which raises its index of coincidence above that of random text. Every start
+position of every wheel order is scored and the best candidates of each wheel
+order are kept for the plugboard search."""
+
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from enigma.analysis.bombe import reflector_positions, wheel_orders
+from enigma.analysis.sweep import sweep_positions
+from enigma.api.enigma_api import EnigmaAPI
+from enigma.core import vectorized
+from enigma.core.components import HISTORICAL
+
+
+def index_of_coincidence(rows, size):
+    """Returns the index of coincidence of every row of charset indexes
+    :param rows: {np.ndarray} 2D array of charset indexes with a text per row
+    :param size: {int} Charset length
+    :return: {np.ndarray} Index of coincidence of each row
+    """
+    np = vectorized.np
+    count, length = rows.shape
+    if length < 2:
+        return np.zeros(count)
+
+    # Letter counts of all rows at once, each row counts into its own bins
+    bins = rows + (np.arange(count) * size)[:, None]
+    counts = np.bincount(bins.ravel(), minlength=count * size).reshape(count, size)
+    return (counts * (counts - 1)).sum(axis=1) / (length * (length - 1))
+
+
+def search_order(model, reflector, rotors, ciphertext, top=10):
+    """Scores every start position of a single wheel order, rotatable reflectors
+    are scored in every position too
+    :param model: {str} Enigma model
+    :param reflector: {str} Reflector label
+    :param rotors: {[str, str, ...]} Rotor labels
+    :param ciphertext: {str} Intercepted message
+    :param top: {int} Number of best candidates to keep
+    :return: {([dict, ...], int)} Best candidates (best first) with the reflector,
+             rotors, start positions, score and the reflector position if the
+             reflector is rotatable, and the number of positions tried
+    """
+    np = vectorized.np
+    enigma_api = EnigmaAPI(model, reflector, list(rotors), position_buffer=0)
+    size = len(enigma_api.charset())
+
+    # Each reflector position adds the same number of rows
+    positions = reflector_positions(enigma_api)
+    offsets, scores = [], []
+    for position in positions:
+        if position is not None:
+            enigma_api.reflector_position(position)
+        found = sweep_positions(
+            enigma_api.get_config(), ciphertext,
+            score=lambda rows: index_of_coincidence(rows, size)
+        )
+        offsets.append(found[0])
+        scores.append(found[1])
+    offsets, scores = np.concatenate(offsets), np.concatenate(scores)
+    rows = len(scores) // len(positions)
+
+    # Best rows are selected in bulk, sorting them by row first makes earlier
+    # positions win ties in the stable sort by score
+    if top < len(scores):
+        selected = np.sort(np.argpartition(scores, -top)[-top:])
+    else:
+        selected = np.arange(len(scores))
+    selected = selected[np.argsort(-scores[selected], kind="stable")]
+
+    enigma = enigma_api.enigma()
+    candidates = []
+    for row in selected:
+        enigma.offsets(offsets[row])
+        candidate = {
+            "reflector": reflector,
+            "rotors": list(rotors),
+            "positions": list(enigma.positions()),
+            "score": float(scores[row]),
+        }
+        position = positions[row // rows]
+        if position is not None:
+            enigma_api.reflector_position(position)
+            candidate["reflector_position"] = enigma_api.reflector_position()
+        candidates.append(candidate)
+    return candidates, len(scores)
+
+
+def _search_order(args):
+    """Process pool entry point of search_order"""
+    return search_order(*args)
+
+
+def ioc_search(ciphertext, model, top=10, reflectors=None, orders=None, workers=None,
+               progress=None):
+    """Searches all wheel orders and start positions of a model with an empty
+    plugboard and ring settings at their default, wheel orders are spread across
+    worker processes
+    :param ciphertext: {str} Intercepted message
+    :param model: {str} Enigma model
+    :param top: {int} Number of best candidates kept for each wheel order
+    :param reflectors: {[str, str, ...]} Reflector labels to try, see wheel_orders
+    :param orders: {[(str, [str, str, ...]), ...]} Reflector and rotor labels to
+                                                  try, all wheel orders if None
+    :param workers: {int} Number of worker processes, 1 searches in this process
+    :param progress: {callable} Called with the number of finished and all wheel
+                                orders and keys tried per second after each
+                                wheel order, progress is logged if None
+    :return: {[dict, ...]} Best candidates of all wheel orders, best first
+    """
+    if vectorized.np is None:
+        raise ImportError("Rotor searches require NumPy!")
+    if model not in HISTORICAL:
+        raise ValueError("Enigma model '%s' does not exist!" % model)
+    if not isinstance(top, int) or top < 1:
+        raise ValueError("Number of kept candidates must be a positive integer!")
+
+    orders = wheel_orders(model, reflectors) if orders is None else orders
+    jobs = [(model, reflector, rotors, ciphertext, top) for reflector, rotors in orders]
+
+    candidates, keys = [], 0
+    start = time.perf_counter()
+
+    def report(done):
+        rate = keys / max(time.perf_counter() - start, 1e-9)
+        if progress is None:
+            logging.info("Searched %d/%d wheel orders (%d keys/s)...", done, len(jobs), rate)
+        else:
+            progress(done, len(jobs), rate)
+
+    if workers == 1:
+        for done, job in enumerate(jobs, 1):
+            found, tried = search_order(*job)
+            candidates += found
+            keys += tried
+            report(done)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_search_order, job) for job in jobs]
+            for done, future in enumerate(as_completed(futures), 1):
+                found, tried = future.result()
+                candidates += found
+                keys += tried
+                report(done)
+
+    return sorted(candidates, key=lambda candidate: candidate["score"], reverse=True)
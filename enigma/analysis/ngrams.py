@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""N-gram log-probability tables. Every n-gram of a charset is packed into a
+single integer code (the charset indexes of its letters as digits of a number
+in base charset length), log-probabilities are held in a flat float32 array
+indexed by these codes so scoring never builds substrings. Tables are compiled
+from a text corpus once and saved in a binary format that is loaded trough a
+read-only memory map, so all processes loading a table share its memory."""
+
+from array import array
+from math import log10
+from mmap import ACCESS_READ, mmap
+
+from enigma.core import ALPHABET, vectorized
+
+MAGIC = b"ENG1"  # Header of saved tables, followed by n and the charset
+
+# Letters Enigma operators spelled out because the machine lacks them
+FOLDED = {"Ä": "AE", "Ö": "OE", "Ü": "UE", "ß": "SS"}
+
+
+def normalize(text):
+    """Uppercases text and spells out umlauts and sharp s the way operators did
+    :param text: {str} German or English text
+    :return: {str}
+    """
+    for letter, replacement in FOLDED.items():
+        text = text.replace(letter, replacement).replace(letter.lower(), replacement)
+    return text.upper()
+
+
+def compile_tables(text, orders=(1, 2, 3, 4), charset=ALPHABET):
+    """Compiles tables of several n-gram lengths from the same corpus
+    :param text: {str} Training corpus
+    :param orders: {(int, int, ...)} N-gram lengths to compile tables of
+    :param charset: {str} Character set the n-grams are made of
+    :return: {dict} NgramTable of each n-gram length
+    """
+    indices = NgramTable.indices(normalize(text), charset)
+    return {n: NgramTable.from_indices(indices, n, charset) for n in orders}
+
+
+class NgramTable:
+    """Log-probabilities of all n-grams of a charset"""
+
+    def __init__(self, n, table, charset=ALPHABET):
+        """
+        :param n: {int} N-gram length
+        :param table: {sequence} Log-probability of every packed n-gram code
+        :param charset: {str} Character set the n-grams are made of
+        """
+        if not isinstance(n, int) or n < 1:
+            raise ValueError("N-gram length must be a positive integer!")
+        if len(table) != len(charset) ** n:
+            raise ValueError("Table of %d-grams must have %d entries!" % (n, len(charset) ** n))
+
+        self._n = n
+        self._table = table
+        self._charset = charset
+        self._size = len(charset)
+        self._filename = None  # Set if the table is memory mapped from a file
+
+    @staticmethod
+    def indices(text, charset=ALPHABET):
+        """Returns charset indexes of all letters of a text that are in the charset
+        :param text: {str} Text (uppercase)
+        :param charset: {str} Character set
+        :return: {np.ndarray or [int, int, ...]}
+        """
+        np = vectorized.np
+        if np is not None and len(charset) < 255 and charset.isascii():
+            # Letters outside of ASCII are never in the charset, so they are dropped
+            text = text.encode("ascii", "ignore")
+            lookup = np.full(256, 255, dtype=np.uint8)
+            lookup[np.frombuffer(charset.encode("ascii"), dtype=np.uint8)] = np.arange(
+                len(charset), dtype=np.uint8
+            )
+            indices = lookup[np.frombuffer(text, dtype=np.uint8)]
+            return indices[indices != 255]
+
+        indexes = {letter: i for i, letter in enumerate(charset)}
+        return [indexes[letter] for letter in text if letter in indexes]
+
+    @classmethod
+    def from_text(cls, text, n, charset=ALPHABET):
+        """Compiles n-gram log-probabilities of a text, letters outside of the
+        charset are skipped and n-grams never seen get a floor probability
+        :param text: {str} Training text
+        :param n: {int} N-gram length
+        :param charset: {str} Character set the n-grams are made of
+        :return: {NgramTable}
+        """
+        return cls.from_indices(cls.indices(normalize(text), charset), n, charset)
+
+    @classmethod
+    def from_indices(cls, indices, n, charset=ALPHABET):
+        """Compiles n-gram log-probabilities of a text of charset indexes
+        :param indices: {sequence} Charset indexes of the training text
+        :param n: {int} N-gram length
+        :param charset: {str} Character set the n-grams are made of
+        :return: {NgramTable}
+        """
+        size, np = len(charset), vectorized.np
+        total = max(len(indices) - n + 1, 1)
+        floor = log10(0.01 / total)
+
+        table = array("f")
+        if np is not None:
+            counts = np.bincount(cls.codes(np.asarray(indices), n, size), minlength=size ** n)
+            with np.errstate(divide="ignore"):
+                logs = np.where(counts, np.log10(counts / total), floor)
+            table.frombytes(logs.astype(np.float32).tobytes())
+        else:
+            counts = [0] * size ** n
+            modulo, code = size ** (n - 1), 0
+            for i, index in enumerate(indices):
+                code = code % modulo * size + index
+                if i >= n - 1:
+                    counts[code] += 1
+            table.extend(log10(count / total) if count else floor for count in counts)
+
+        return cls(n, table, charset)
+
+    @staticmethod
+    def codes(indices, n, size):
+        """Returns packed codes of all n-grams of arrays of charset indexes
+        :param indices: {np.ndarray} Charset indexes, texts along the last axis
+        :param n: {int} N-gram length
+        :param size: {int} Charset length
+        :return: {np.ndarray} Codes with one item less than n-gram length fewer
+                 along the last axis
+        """
+        np = vectorized.np
+        count = max(indices.shape[-1] - n + 1, 0)
+        codes = np.zeros(indices.shape[:-1] + (count,), dtype=np.intp)
+        for i in range(n):
+            codes *= size
+            codes += indices[..., i:i + count]
+        return codes
+
+    def save(self, file):
+        """Writes the table to a binary file
+        :param file: {file} File object opened for binary writing
+        """
+        charset = self._charset.encode("utf-8")
+        header = MAGIC + bytes([self._n]) + len(charset).to_bytes(2, "little") + charset
+        file.write(header + bytes(-len(header) % 4))  # Table aligned for float32 access
+        file.write(array("f", self._table).tobytes())
+
+    @classmethod
+    def load(cls, filename):
+        """Loads a table saved by save trough a read-only memory map, so processes
+        loading the same file share its memory
+        :param filename: {str} Path to the saved table
+        :return: {NgramTable}
+        """
+        with open(filename, "rb") as file:
+            data = mmap(file.fileno(), 0, access=ACCESS_READ)
+
+        try:
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError
+            n = data[len(MAGIC)]
+            length = int.from_bytes(data[len(MAGIC) + 1:len(MAGIC) + 3], "little")
+            charset = data[len(MAGIC) + 3:len(MAGIC) + 3 + length].decode("utf-8")
+            header = len(MAGIC) + 3 + length
+            header += -header % 4
+            if len(data) != header + len(charset) ** n * array("f").itemsize:
+                raise ValueError
+        except (ValueError, UnicodeDecodeError):
+            data.close()
+            raise ValueError("File '%s' does not contain an n-gram table!" % filename)
+
+        view = memoryview(data)[header:].cast("f")
+        try:
+            table = cls(n, view, charset)
+        except ValueError:
+            view.release()  # The map can't be closed while it is viewed
+            data.close()
+            raise
+        table._filename = filename
+        return table
+
+    def __reduce__(self):
+        """Memory mapped tables are sent to worker processes as their file name
+        and mapped again there instead of being copied"""
+        if self._filename is not None:
+            return self.load, (self._filename,)
+        return self.__class__, (self._n, array("f", self._table), self._charset)
+
+    def n(self):
+        """Returns the n-gram length"""
+        return self._n
+
+    def charset(self):
+        """Returns the character set the n-grams are made of"""
+        return self._charset
+
+    def table(self):
+        """Returns the flat log-probability table"""
+        return self._table
+
+    def code(self, indices):
+        """Packs charset indexes of a single n-gram to its table index
+        :param indices: {iterable} Charset indexes of n letters
+        :return: {int}
+        """
+        code = 0
+        for index in indices:
+            code = code * self._size + index
+        return code
+
+    def score(self, indices):
+        """Returns the summed log-probability of all n-grams of a text
+        :param indices: {sequence} Charset indexes of the text (the integer coded
+                                   output of the machine)
+        :return: {float}
+        """
+        np = vectorized.np
+        if np is not None and isinstance(indices, np.ndarray):
+            return float(self.score_rows(indices[None, :])[0])
+
+        table, size = self._table, self._size
+        modulo, code, total = size ** (self._n - 1), 0, 0.0
+        for i, index in enumerate(indices):
+            code = code % modulo * size + index
+            if i >= self._n - 1:
+                total += table[code]
+        return total
+
+    def score_rows(self, rows):
+        """Returns the summed log-probability of all n-grams of every row
+        :param rows: {np.ndarray} 2D array of charset indexes with a text per row
+        :return: {np.ndarray} Score of each row
+        """
+        np = vectorized.np
+        table = np.asarray(self._table, dtype=np.float32)
+        codes = self.codes(np.asarray(rows), self._n, self._size)
+        return table[codes].sum(axis=-1, dtype=np.float64)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Plugboard independent scrambler permutations. With wheel order, ring settings
+and start positions fixed, the stator, rotors and reflector form the same
+permutation at each key press regardless of the plugboard, so candidate
+plugboards are only applied on top of permutations computed once."""
+
+from array import array
+
+from enigma.api.enigma_api import EnigmaAPI
+from enigma.core import ALPHABET, vectorized
+from enigma.core.components import Plugboard
+
+
+def plugboard_table(pairs, charset=ALPHABET):
+    """Returns the routing table of a plugboard with select pairs
+    :param pairs: {["AB", "CD", ...]} Plugboard pairs
+    :param charset: {str} Character set the table is indexed by
+    :return: {[int, int, ...]} Routed charset index of every charset index
+    """
+    plugboard = Plugboard(pairs, charset)
+    return [plugboard.route_index(index) for index in range(len(charset))]
+
+
+class Scrambler:
+    """Scrambler permutations of each key press of a message"""
+
+    def __init__(self, api_config, length):
+        """Computes scrambler permutations for select number of key presses
+        :param api_config: {dict} Settings in the EnigmaAPI.get_config format,
+                                  plugboard pairs and Uhr are ignored
+        :param length: {int} Number of key presses to compute permutations for
+        """
+        config = {key: value for key, value in api_config.items() if key != "uhr_position"}
+        if config.get("plug_pairs") is not None:
+            config["plug_pairs"] = []
+
+        enigma_api = EnigmaAPI(config["model"], position_buffer=0)
+        enigma_api.load_from_config(config)
+        enigma = enigma_api.enigma()
+
+        self._size = size = len(enigma.charset())
+        self._length = length
+        self._table = table = array("B")
+        for _ in range(length):
+            enigma.advance(1)
+            table.extend(enigma.substitution())
+
+    def size(self):
+        """Returns the charset length of the permutations"""
+        return self._size
+
+    def length(self):
+        """Returns the number of key presses permutations were computed for"""
+        return self._length
+
+    def table(self):
+        """Returns permutations of all key presses, the scrambled charset index of
+        index i at key press p is at p * size + i
+        :return: {array} Unsigned byte array
+        """
+        return self._table
+
+    def permutation(self, press):
+        """Returns the scrambler permutation of select key press
+        :param press: {int} Key press index, starting at 0
+        :return: {array} Scrambled charset index of every charset index
+        """
+        if not 0 <= press < self._length:
+            raise ValueError("No scrambler permutation for key press %d!" % press)
+        return self._table[press * self._size:(press + 1) * self._size]
+
+    def apply(self, indices, forward=None, backward=None):
+        """Encrypts charset indexes trough the scrambler with a plugboard applied
+        on both sides, same as pressing the keys on the configured Enigma
+        :param indices: {iterable} Charset indexes to encrypt, at most length of them
+        :param forward: {[int, int, ...]} Plugboard routing table on the way in,
+                                         no plugboard if None
+        :param backward: {[int, int, ...]} Plugboard routing table on the way out,
+                                          same as forward if None (only the Uhr
+                                          is wired differently in each direction)
+        :return: {np.ndarray or array} Encrypted uint8 charset indexes
+        """
+        size = self._size
+        forward = range(size) if forward is None else forward
+        backward = forward if backward is None else backward
+
+        np = vectorized.np
+        if np is not None:
+            indices = np.asarray(indices, dtype=np.intp)
+            if indices.size > self._length:
+                raise ValueError("Scrambler only has permutations for %d key presses!"
+                                 % self._length)
+            forward, backward = np.asarray(forward), np.asarray(backward, dtype=np.uint8)
+            table = np.frombuffer(self._table, dtype=np.uint8)
+            presses = np.arange(indices.size) * size
+            return backward[table[presses + forward[indices]]]
+
+        indices = list(indices)
+        if len(indices) > self._length:
+            raise ValueError("Scrambler only has permutations for %d key presses!" % self._length)
+        table = self._table
+        return array("B", [backward[table[press * size + forward[index]]]
+                           for press, index in enumerate(indices)])
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Decryption of a message under every starting position of a fixed wheel order.
+The states of the stepping rotors form cycles, so the key presses following any
+starting position are a window of a cycle that is laid out only once."""
+
+from itertools import product
+
+from enigma.api.enigma_api import EnigmaAPI
+from enigma.core import vectorized
+from enigma.core.keystream import Keystream
+
+
+def cycle_layout(successors):
+    """Lays out all cycles of the stepping state graph one after another
+    :param successors: {[int, int, ...]} Successor of every state
+    :return: {([int, ...], [int, ...], [int, ...], [int, ...])} States of all
+             cycles in order and for every state its index in that order (-1 if
+             it leads into a cycle without being on one), the index its cycle
+             starts at and the length of its cycle
+    """
+    count = len(successors)
+    order = []
+    position, starts, lengths = [-1] * count, [0] * count, [0] * count
+
+    visited = bytearray(count)  # 1 = on the path being walked, 2 = done
+    for state in range(count):
+        path = []
+        while not visited[state]:
+            visited[state] = 1
+            path.append(state)
+            state = successors[state]
+
+        if visited[state] == 1:  # The walk closed a new cycle
+            cycle = path[path.index(state):]
+            for i, cycle_state in enumerate(cycle):
+                position[cycle_state] = len(order) + i
+                starts[cycle_state] = len(order)
+                lengths[cycle_state] = len(cycle)
+            order.extend(cycle)
+
+        for path_state in path:
+            visited[path_state] = 2
+
+    return order, position, starts, lengths
+
+
+def sweep_states(successors, length):
+    """Returns the states after each key press starting from every state
+    :param successors: {[int, int, ...]} Successor of every state
+    :param length: {int} Number of key presses
+    :return: {np.ndarray} Array with a row of states per starting state
+    """
+    np = vectorized.np
+    order, position, starts, lengths = (
+        np.array(values, dtype=np.intp) for values in cycle_layout(successors)
+    )
+    successors = np.array(successors, dtype=np.intp)
+
+    # States leading into a cycle are walked until all states are on a cycle
+    head = []
+    state = successors  # State after the first key press from every state
+    while len(head) < length and (position[state] < 0).any():
+        head.append(state)
+        state = successors[state]
+
+    # The remaining states are a window of the cycle of each state
+    shifts = np.arange(length - len(head))
+    start, offset = starts[state], position[state] - starts[state]
+    tail = order[start[:, None] + (offset[:, None] + shifts) % lengths[state][:, None]]
+
+    return np.concatenate([np.stack(head, axis=1), tail], axis=1) if head else tail
+
+
+def sweep_positions(api_config, ciphertext, score=None):
+    """Decrypts ciphertext under every starting position of all rotors, all
+    other settings are taken from the config
+    :param api_config: {dict} Settings in the EnigmaAPI.get_config format,
+                              rotor positions are ignored
+    :param ciphertext: {str} Message to decrypt
+    :param score: {callable} Function that receives a uint8 array of decrypted
+                             charset indexes with a row per starting position
+                             and returns a score for each row, decrypts are
+                             returned if None
+    :return: {(np.ndarray, np.ndarray)} Rotor offsets of each starting position
+             (first rotor first) and the decrypts or scores of each position
+    """
+    np = vectorized.np
+    if np is None:
+        raise ImportError("Position sweeps require NumPy!")
+
+    enigma_api = EnigmaAPI(api_config["model"], position_buffer=0)
+    enigma_api.load_from_config(api_config)
+    enigma = enigma_api.enigma()
+
+    charset = enigma.charset()
+    indexes = {letter: i for i, letter in enumerate(charset)}
+    try:
+        indices = np.array([indexes[letter] for letter in ciphertext], dtype=np.intp)
+    except KeyError as err:
+        raise ValueError("This Enigma instance does not have a '%s' key!" % err.args[0])
+
+    size = len(charset)
+    static = len(enigma.offsets()) - 3
+    stepping = np.indices((size,) * 3).reshape(3, -1).T
+
+    # Stepping does not depend on the static rotors, only the tables do
+    states = None
+    offsets, results = [], []
+    for static_offsets in product(range(size), repeat=static):
+        enigma.offsets(static_offsets + (0, 0, 0))  # Stepping rotors are all in the tables
+
+        keystream = Keystream(enigma)
+        if states is None:
+            states = sweep_states(keystream.successors(), indices.size) * size + indices
+        decrypts = np.frombuffer(keystream.table(), dtype=np.uint8)[states]
+        results.append(decrypts if score is None else np.asarray(score(decrypts)))
+        offsets.append(np.hstack([np.full((len(stepping), static), static_offsets,
+                                          dtype=np.intp), stepping]))
+
+    return np.concatenate(offsets).astype(np.uint8), np.concatenate(results)
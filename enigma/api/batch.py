@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Batch encryption of many messages with different configurations, jobs are
+processed by a pool of worker processes that reuse already built machines"""
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from json import JSONDecodeError, loads
+
+from enigma.api.enigma_api import EnigmaAPI
+from enigma.core.shared import SharedTables, attach
+
+MACHINE_CACHE = 64  # Number of warm machines kept by each worker process
+JOB_CHUNK = 64  # Number of jobs sent to a worker process at a time
+
+_machines = OrderedDict()  # Warm machines of this process by model and wheel order
+
+
+def machine(config):
+    """Returns a warm machine for the model and wheel order of the config with
+    all remaining settings of the config loaded
+    :param config: {dict} Settings in the EnigmaAPI.get_config format
+    """
+    key = (config["model"], config["reflector"], tuple(config["rotors"]))
+    enigma_api = _machines.pop(key, None)
+    if enigma_api is None:
+        enigma_api = EnigmaAPI(
+            config["model"], config["reflector"], config["rotors"], position_buffer=0
+        )
+        if len(_machines) >= MACHINE_CACHE:
+            _machines.popitem(last=False)
+    _machines[key] = enigma_api
+
+    # A fresh reflector drops the position and rewiring of the previous job
+    enigma_api.reflector(config["reflector"])
+    enigma_api.positions(config["rotor_positions"])
+    enigma_api.ring_settings(config["ring_settings"])
+
+    if config.get("reflector_position") is not None:
+        enigma_api.reflector_position(config["reflector_position"])
+
+    if config.get("reflector_pairs"):
+        enigma_api.reflector_pairs(config["reflector_pairs"])
+
+    if "uhr_position" in config:
+        enigma_api.uhr("connect")
+        enigma_api.uhr_position(config["uhr_position"])
+    elif enigma_api.uhr():
+        enigma_api.uhr("disconnect")
+
+    if config.get("plug_pairs") is not None:
+        enigma_api.plug_pairs(config["plug_pairs"])
+    elif enigma_api.data()["plugboard"]:
+        enigma_api.plug_pairs([])
+
+    enigma_api.set_checkpoint()
+    return enigma_api
+
+
+def run_job(line):
+    """Encrypts the message of a single JSON job line, errors are returned in
+    the result instead of being raised
+    :param line: {str} JSON object with EnigmaAPI.get_config keys and a "message"
+    :return: {dict} Result with either a "message" or an "error" key
+    """
+    try:
+        job = loads(line)
+        message = job["message"].upper()
+        enigma_api = machine(job)
+        return {"message": enigma_api.encrypt(message), "positions": list(enigma_api.positions())}
+    except JSONDecodeError as err:
+        return {"error": "Invalid JSON: %s" % str(err)}
+    except KeyError as err:
+        return {"error": "Missing job key %s!" % str(err)}
+    except (TypeError, ValueError, AttributeError, IndexError) as err:
+        return {"error": str(err)}
+
+
+def run_batch(lines, workers=None):
+    """Encrypts all jobs and yields their results in input order, blank
+    lines are skipped and jobs are numbered from 1 in the "job" key
+    :param lines: {iterable} JSON job lines
+    :param workers: {int} Number of worker processes, 1 runs jobs in this process
+    """
+    lines = (line for line in lines if line.strip())
+    tables = executor = None
+    if workers != 1:  # Workers share component tables of all models
+        tables = SharedTables()
+        executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=attach, initargs=(tables.name(),)
+        )
+
+    try:
+        if executor is None:
+            results = map(run_job, lines)
+        else:
+            results = executor.map(run_job, lines, chunksize=JOB_CHUNK)
+
+        for i, result in enumerate(results, 1):
+            yield dict(job=i, **result)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+            tables.close()
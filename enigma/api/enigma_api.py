@@ -2,9 +2,18 @@
 # pylint: disable=inconsistent-return-statements
 """EnigmaAPI class that simplifies interaction with Enigma objects and their."""
 
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from mmap import ACCESS_READ, mmap
+from os import fstat, path
+
+from enigma.core import shared, vectorized
 from enigma.core.components import (HISTORICAL, UKW_D, UKWD, Enigma, Reflector,
                                     Rotor, Stator, format_position)
+from enigma.core.keystream import Keystream
 from enigma.utils.cfg_handler import load_config, save_config
+from enigma.utils.ring_buffer import RingBuffer
 
 
 def check_iterable(values, name):
@@ -19,18 +28,28 @@ def check_iterable(values, name):
 class EnigmaAPI:
     """Wrapper for easier management of Enigma objects and their components"""
 
-    def __init__(self, model, reflector=None, rotors=None, position_buffer=10000):
+    def __init__(self, model, reflector=None, rotors=None, position_buffer=10000, cache_size=0):
         """
         :param model: {str} Enigma machine model label
         :param reflector: {str} Reflector label like "UKW-B"
         :param rotors: {[str, str, str]} Rotor labels
-        :param position_buffer: {int} Number of positions in the saved position buffer
+        :param position_buffer: {int} Number of positions in the saved position buffer,
+                                      0 reverts by recomputing positions from
+                                      the checkpoint instead of keeping a buffer
+        :param cache_size: {int} Number of rotor positions to memoize substitutions
+                                 for, 0 disables the substitution cache
         """
         self._enigma = self.generate_enigma(model, reflector, rotors)
+        self._enigma.substitution_cache(cache_size)
 
-        self.__buffer = []
+        self.__buffer = RingBuffer(position_buffer + 1) if position_buffer else None
         self.__buffer_size = position_buffer
         self.__checkpoint = 0
+        self.__pressed = 0  # Keys pressed since the checkpoint
+
+        self.__precompiled = False
+        self.__keystream = None
+        self.__keystream_cache = None
 
     # GETTERS
 
@@ -99,7 +118,12 @@ class EnigmaAPI:
         :param new_model: {str}
         """
         if new_model is not None:
+            cache_size = self._enigma.substitution_cache()
+            compiled_stepping = self._enigma.compiled_stepping()
             self._enigma = self.generate_enigma(new_model)
+            self._enigma.substitution_cache(cache_size)
+            self._enigma.compiled_stepping(compiled_stepping)
+            self.__keystream = None
             self.set_checkpoint()
         else:
             return self._enigma.model()
@@ -216,27 +240,69 @@ class EnigmaAPI:
         """Returns current Enigma charset"""
         return self._enigma.charset()
 
+    def enigma(self):
+        """Returns the wrapped Enigma instance"""
+        return self._enigma
+
+    def substitution_cache(self, size=None):
+        """Returns the substitution cache size if size is None, else sets it
+        :param size: {int} Number of rotor positions to memoize substitutions
+                           for, 0 disables the substitution cache
+        """
+        return self._enigma.substitution_cache(size)
+
+    def compiled_stepping(self, enabled=None):
+        """Returns whether compiled stepping is enabled if enabled is None, else
+        enables or disables it
+        :param enabled: {bool} Steps the rotors by a compiled state table if True
+        """
+        return self._enigma.compiled_stepping(enabled)
+
+    def precompiled(self, enabled=None):
+        """Returns whether precompiled encryption is enabled if enabled is None,
+        else enables or disables it. Precompiled encryption walks a table of
+        substitutions for every stepping rotor state, the table is compiled lazily
+        and only recompiled when settings other than rotor positions change.
+        :param enabled: {bool}
+        """
+        if enabled is not None:
+            self.__precompiled = bool(enabled)
+            if not self.__precompiled:
+                self.__keystream = None
+        else:
+            return self.__precompiled
+
+    def keystream_cache(self, cache=None):
+        """Returns the keystream cache if cache is None, else sets it. Tables
+        compiled in precompiled mode are stored in the cache and loaded from it
+        instead of compiling them again, also by other processes.
+        :param cache: {KeystreamCache} Cache to use, False disables the cache
+        """
+        if cache is not None:
+            self.__keystream_cache = cache or None
+        else:
+            return self.__keystream_cache
+
     # BUFFER TOOLS
 
     def __serialized_position(self):
-        """Serializes current rotor positions to a single integer
-        For example: [02, 13, 5, 22] -> 2130522
+        """Serializes current rotor positions to a single integer with one
+        base len(charset) digit per rotor, the first rotor being the most
+        significant. For example: [02, 13, 05, 22] -> ((1 * 26 + 12) * 26 + 4) * 26 + 21
         This method saves space in memory
         """
-        serialized = ""
-
-        for pos in self._enigma.positions():
-            if pos in self.charset():
-                serialized += "%02d" % self.charset().index(pos)
-            else:
-                serialized += "%02d" % (int(pos) - 1)
-        return int(serialized)
+        size = len(self.charset())
+        serialized = 0
+        for offset in self._enigma.offsets():
+            serialized = serialized * size + offset
+        return serialized
 
     def set_checkpoint(self):
         """Sets the starting position of the currently typed message (this can
         later be loaded)
         """
         self.__checkpoint = self.__serialized_position()
+        self.__pressed = 0
 
     def load_checkpoint(self):
         """Sets rotor positions to the checkpoint position"""
@@ -248,34 +314,52 @@ class EnigmaAPI:
 
     def __clear_buffer(self):
         """Erases all saved positions in the position buffer"""
-        self.__buffer = []
+        if self.__buffer is not None:
+            self.__buffer.clear()
 
     def buffer_full(self):
         """Checks if the position buffer has reached its maximum length,
         returns maximum buffer size if buffer is full."""
+        if self.__buffer is None:
+            return False
         return len(self.__buffer) > self.__buffer_size
 
     def __save_position(self):
         """Saves current Enigma rotor position to the position buffer"""
-        if self.buffer_full():
-            self.__buffer.pop(0)
-        self.__buffer.append(self.__serialized_position())
+        self.__pressed += 1
+        if self.__buffer is not None:
+            self.__buffer.append(self.__serialized_position())
+
+    def __save_states(self, pressed, states):
+        """Saves positions reached during bulk encryption to the position buffer
+        :param pressed: {int} Number of keys pressed during bulk encryption
+        :param states: {iterable} Packed (left * size + middle) * size + right
+                                  offsets of the stepping rotors in the order
+                                  they were reached (at least the last ones
+                                  that fit in the buffer)
+        """
+        self.__pressed += pressed
+        if self.__buffer is None:
+            return
+
+        # Stepping rotors are the three least significant digits
+        stepping = len(self.charset()) ** 3
+        static = self.__serialized_position() // stepping * stepping
+
+        self.__buffer.extend(static + state for state in states)
 
     def __load_position(self, position):
         """Deserializes position from an integer to the original form (list of
         rotor positions)
         :param position: {int} position to be loaded
         """
-        formula = "%0" + str(self.rotor_n() * 2) + "d"
+        size = len(self.charset())
         positions = []
-        pair = ""
-        for letter in formula % position:
-            pair += letter
-            if len(pair) == 2:
-                positions.append(int(pair) + 1)
-                pair = ""
+        for _ in range(self.rotor_n()):
+            position, offset = divmod(position, size)
+            positions.append(offset + 1)
 
-        return positions
+        return positions[::-1]
 
     def revert_by(self, revert_by=1):
         """Reverts by "by" positions back (used when backspace is pressed
@@ -285,28 +369,237 @@ class EnigmaAPI:
         if revert_by < 0:
             raise ValueError("Enigma can only be reverted by 1 or more positions")
 
-        self.__buffer = self.__buffer[:-revert_by]
+        self.__pressed = max(self.__pressed - revert_by, 0)
 
-        if not self.__buffer:
-            position = self.__checkpoint
-        else:
-            position = self.__buffer[-1]
+        if self.__buffer is not None and len(self.__buffer) > revert_by:
+            self.__buffer.truncate(revert_by)
+            self._enigma.positions(self.__load_position(self.__buffer.last()))
+            return
 
-        self._enigma.positions(self.__load_position(position))
+        # Positions are no longer buffered, they are recomputed from the checkpoint
+        self.__clear_buffer()
+        self._enigma.positions(self.__load_position(self.__checkpoint))
+        self._enigma.advance(self.__pressed)
 
     # ENCRYPTION
 
-    def encrypt(self, text):
+    def encrypt(self, text, parallel=None):
         """Encrypts text using the current Enigma object, also saves position
         to the position buffer
         :param text: {char} Text to encrypt
+        :param parallel: {int} Number of worker processes to split the text
+                               between, encrypts in this process if None or 1
         """
-        output = ""
+        if parallel is not None and parallel > 1 and text:
+            return self.__encrypt_parallel(text, parallel)
+
+        if self.__precompiled:
+            return self.__encrypt_precompiled(text)
+
+        output = []
         for letter in text:
-            output += self._enigma.press_key(letter)
+            output.append(self._enigma.press_key(letter))
             self.__save_position()
+        return "".join(output)
+
+    def encrypt_stream(self, chunks):
+        """Encrypts an iterable of text chunks lazily, yielding each encrypted
+        chunk as soon as it is encrypted (rotor positions carry over between
+        chunks, so the output is the same as encrypting the joined text)
+        :param chunks: {iterable} Text chunks to encrypt
+        """
+        for chunk in chunks:
+            yield self.encrypt(chunk)
+
+    def __encrypt_parallel(self, text, workers):
+        """Splits text into chunks and encrypts them in a process pool, each
+        worker jumps to the starting rotor position of its chunk
+        :param text: {str} Text to encrypt
+        :param workers: {int} Number of worker processes
+        """
+        for letter in set(text):
+            if letter not in self.charset():
+                raise ValueError("This Enigma instance does not have a '%s' key!" % letter)
+
+        config = self.get_config()
+        # Numeric offsets are valid positions for every charset
+        config["rotor_positions"] = [offset + 1 for offset in self._enigma.offsets()]
+
+        chunk_size = -(-len(text) // workers)
+        starts = range(0, len(text), chunk_size)
+        chunks = [text[start:start + chunk_size] for start in starts]
+
+        # Workers build their components on top of tables compiled here once
+        tables = shared.SharedTables(models=[self.model()])
+        try:
+            with ProcessPoolExecutor(
+                    max_workers=workers, initializer=shared.attach, initargs=(tables.name(),)
+            ) as executor:
+                results = list(executor.map(
+                    EnigmaAPI._encrypt_chunk,
+                    repeat(config),
+                    repeat((self.__buffer_size, self.__precompiled, self.__keystream_cache)),
+                    starts,
+                    chunks,
+                ))
+        finally:
+            tables.close()
+
+        self._enigma.advance(len(text))
+        self.__pressed += len(text)
+        if self.__buffer is not None:
+            for _, buffer in results:
+                self.__buffer.extend(buffer)
+
+        return "".join([output for output, _ in results])
+
+    @staticmethod
+    def _encrypt_chunk(config, options, start, chunk):
+        """Encrypts a chunk of text in a worker process
+        :param config: {dict} Configuration with positions at the start of the text
+        :param options: {(int, bool, KeystreamCache)} Position buffer size,
+                        precompiled mode and keystream cache
+        :param start: {int} Index of the first letter of the chunk in the text
+        :param chunk: {str} Text to encrypt
+        :return: {(str, [int, int, ...])} Encrypted chunk and position buffer
+        """
+        enigma_api = EnigmaAPI(config["model"], position_buffer=options[0])
+        enigma_api.load_from_config(config)
+        enigma_api.precompiled(options[1])
+        enigma_api.keystream_cache(options[2] or False)
+        enigma_api.enigma().advance(start)
+
+        return enigma_api.encrypt(chunk), array("I", enigma_api.__buffer or ())
+
+    def encrypt_array(self, indices):
+        """Encrypts an array of charset indexes with whole-array NumPy operations,
+        falls back to pressing keys one by one if NumPy is not installed. Also
+        saves positions to the position buffer.
+        :param indices: {np.ndarray} uint8 array of charset indexes
+        :return: {np.ndarray} uint8 array of encrypted charset indexes
+                              ({array} of type "B" without NumPy)
+        """
+        if vectorized.np is None:
+            output = array("B")
+            for index in indices:
+                output.append(self._enigma.press_index(index))
+                self.__save_position()
+            return output
+
+        output, stepping = vectorized.encrypt_array(self._enigma, indices)
+        size = len(self.charset())
+        left, middle, right = (offsets[-(self.__buffer_size + 1):] for offsets in stepping)
+        self.__save_states(output.size, ((left * size + middle) * size + right).tolist())
         return output
 
+    def encrypt_file(self, src, dst=None, block_size=1 << 20):
+        """Encrypts a file trough memory maps without reading it into memory,
+        bytes that are not in the charset (spaces, newlines, ...) are copied
+        unchanged so the layout of the file is preserved
+        :param src: {str} Path to the file to encrypt
+        :param dst: {str} Path to write the encrypted file to, the source file is
+                          encrypted in place if None or the same file
+        :param block_size: {int} Number of bytes encrypted at a time
+        :return: {int} Number of encrypted letters
+        """
+        if dst and path.exists(dst) and path.samefile(src, dst):
+            dst = None  # Opening the destination for writing would truncate the source
+
+        with open(src, "rb" if dst else "r+b") as source:
+            size = fstat(source.fileno()).st_size
+            if dst:
+                with open(dst, "w+b") as target:
+                    target.truncate(size)
+                    if not size:  # Empty files can't be mapped
+                        return 0
+                    with mmap(source.fileno(), 0, access=ACCESS_READ) as source_map, \
+                            mmap(target.fileno(), 0) as target_map:
+                        return self.__encrypt_mapped(source_map, target_map, size, block_size)
+
+            if not size:
+                return 0
+            with mmap(source.fileno(), 0) as source_map:
+                return self.__encrypt_mapped(source_map, source_map, size, block_size)
+
+    def __encrypt_mapped(self, source, target, size, block_size):
+        """Encrypts mapped bytes block by block, source and target may be the same map
+        :param source: {mmap} Memory map to read from
+        :param target: {mmap} Memory map to write to
+        :param size: {int} Number of bytes to encrypt
+        :param block_size: {int} Number of bytes encrypted at a time
+        :return: {int} Number of encrypted letters
+        """
+        charset = self.charset().encode("ascii")
+        np = vectorized.np
+        encrypted = 0
+
+        if np is not None:
+            letters = np.frombuffer(charset, dtype=np.uint8)
+            lookup = np.full(256, 255, dtype=np.uint8)  # 255 marks bytes outside the charset
+            lookup[letters] = np.arange(len(charset))
+
+            for start in range(0, size, block_size):
+                count = min(block_size, size - start)
+                data = np.frombuffer(source, dtype=np.uint8, count=count, offset=start)
+                indices = lookup[data]
+                mask = indices != 255
+
+                output = np.frombuffer(target, dtype=np.uint8, count=count, offset=start)
+                if target is not source:
+                    output[:] = data
+                output[mask] = letters[self.encrypt_array(indices[mask])]
+                encrypted += int(mask.sum())
+            return encrypted
+
+        lookup = {byte: i for i, byte in enumerate(charset)}
+        for start in range(0, size, block_size):
+            data = bytearray(source[start:start + block_size])
+            offsets = [i for i, byte in enumerate(data) if byte in lookup]
+            output = self.encrypt_array([lookup[data[i]] for i in offsets])
+            for i, index in zip(offsets, output):
+                data[i] = charset[index]
+            target[start:start + len(data)] = bytes(data)
+            encrypted += len(offsets)
+        return encrypted
+
+    def __compiled_keystream(self):
+        """Returns keystream tables for the current settings, compiling them only
+        if the settings changed since the last compilation"""
+        if self.__keystream is None or not self.__keystream.valid_for(self._enigma):
+            cache, keystream = self.__keystream_cache, None
+            if cache is not None:
+                config = self.get_config()
+                keystream = cache.get(config, self._enigma)
+
+            if keystream is None:
+                keystream = Keystream(self._enigma)
+                if cache is not None:
+                    cache.put(config, keystream)
+            self.__keystream = keystream
+        return self.__keystream
+
+    def __encrypt_precompiled(self, text):
+        """Encrypts text by walking the precompiled keystream tables, also saves
+        positions to the position buffer
+        :param text: {str} Text to encrypt
+        """
+        charset = self.charset()
+        indexes = {letter: i for i, letter in enumerate(charset)}
+        try:
+            indices = [indexes[letter] for letter in text]
+        except KeyError as err:
+            raise ValueError("This Enigma instance does not have a '%s' key!" % err.args[0])
+
+        if not indices:
+            return ""
+
+        keystream = self.__compiled_keystream()
+        output, states = keystream.walk(keystream.state(self._enigma), indices)
+        keystream.load_state(self._enigma, states[-1])
+        self.__save_states(len(states), states[-(self.__buffer_size + 1):])
+
+        return "".join([charset[index] for index in output])
+
     # COMPONENT GENERATORS
 
     @classmethod
@@ -381,11 +674,13 @@ class EnigmaAPI:
         except KeyError:
             raise ValueError("Invalid Enigma model %s!" % model)
 
+        shared_tables = shared.attached()
         final_data = None
         if comp_type == "stator":
             final_data = data[comp_type]
             final_data["charset"] = data["charset"]
-            return Stator(**data[comp_type])
+            tables = shared_tables and shared_tables.tables(model, comp_type)
+            return Stator(**data[comp_type], tables=tables)
         if isinstance(label, int):
             final_data = data[comp_type][label]
         else:
@@ -399,14 +694,15 @@ class EnigmaAPI:
                 "No component of type '%s' with label '%s' found!" % (comp_type, label)
             )
         final_data["charset"] = data["charset"]
+        tables = shared_tables and shared_tables.tables(model, comp_type, final_data["label"])
 
         if comp_type == "rotors":
-            return Rotor(**final_data)
+            return Rotor(**final_data, tables=tables)
 
         if comp_type == "reflectors":
             if label == "UKW-D":
                 return UKWD(UKW_D["wiring"])
-            return Reflector(**final_data, rotatable=data["rotatable_ref"])
+            return Reflector(**final_data, rotatable=data["rotatable_ref"], tables=tables)
 
     # CONFIG SAVE/LOAD
 
@@ -4,6 +4,8 @@
 """Enigma simulation core. Contains all historical data, components and the Enigma
 machine simulation class."""
 
+from collections import OrderedDict
+
 from enigma.core import contains, convert_position, validate_pairs
 from enigma.core.extensions import Uhr
 
@@ -381,14 +383,53 @@ def format_position(charset, position, numeric=False):
     return "%02d" % (position) if numeric else charset[position - 1]
 
 
+def step_offsets(middle, right, middle_notches, right_notches, size):
+    """Steps offsets of the middle and right rotor the same way a key press steps
+    the rotors of an Enigma
+    :param middle: {int} Middle rotor offset
+    :param right: {int} Right rotor offset
+    :param middle_notches: {set} Turnover offsets of the middle rotor
+    :param right_notches: {set} Turnover offsets of the right rotor
+    :param size: {int} Charset length
+    :return: {(int, int, int)} Left rotor step (0 or 1), middle and right offset
+    """
+    left_step = 0
+    if right in right_notches:
+        middle = (middle + 1) % size
+    if middle in middle_notches:
+        middle = (middle + 1) % size
+        left_step = 1
+    return left_step, middle, (right + 1) % size
+
+
+def _wrap(table, rotor):
+    """Returns a permutation composed of a rotor, the permutation and the
+    inverse rotor, as seen from the outer side of the rotor
+    :param table: {[int, int, ...]} Permutation on the inner side of the rotor
+    :param rotor: {Rotor} Rotor in its current position
+    :return: {[int, int, ...]}
+    """
+    size = rotor._max_index
+    offset = rotor._adjusted_offset()
+    forward, backward = rotor._forward_table, rotor._backward_table
+    return [
+        (backward[(table[(forward[(index + offset) % size] - offset) % size] + offset) % size]
+         - offset) % size
+        for index in range(size)
+    ]
+
+
 class Plugboard:
     """Represents the plugboard component of an Enigma machine, not available on all models"""
 
-    def __init__(self, pairs=None):
+    def __init__(self, pairs=None, charset=ALPHABET):
         """
         :param pairs: {[str, str, str, ...} Pairs to connect on the plugboard
+        :param charset: {str} Character set the integer routing table is indexed by
         """
+        self.__charset = charset
         self.__pairs = []
+        self.__table = list(range(len(charset)))
         self.pairs(pairs)
 
     def pairs(self, pairs=None):
@@ -403,6 +444,12 @@ class Plugboard:
             pairs = [pair.upper() for pair in pairs]
             validate_pairs(pairs, "plugboard")
             self.__pairs = pairs
+
+            self.__table = list(range(len(self.__charset)))
+            for pair in pairs:
+                if pair[0] in self.__charset and pair[1] in self.__charset:
+                    a_index, b_index = map(self.__charset.index, pair)
+                    self.__table[a_index], self.__table[b_index] = b_index, a_index
         else:
             return self.__pairs
 
@@ -417,6 +464,14 @@ class Plugboard:
                 return pair[0] if pair[0] != letter else pair[1]
         return letter
 
+    def route_index(self, index, _=None):
+        """Routes charset index trough the wiring pair (if the letter is wired),
+        otherwise returns the same index
+        :param index: {int} input charset index
+        :return: {int} output routed charset index
+        """
+        return self.__table[index]
+
     def __str__(self):
         return "Plugboard\nPlugboard pairs: %s" + " ".join(self.pairs())
 
@@ -424,11 +479,13 @@ class Plugboard:
 class _Component:  # Base component
     """Base class for all components"""
 
-    def __init__(self, label, wiring, charset=ALPHABET):
+    def __init__(self, label, wiring, charset=ALPHABET, tables=None):
         """
         :param label: {str} Component label
         :param wiring: {str} Component wiring
         :param charset: {str} Component character set
+        :param tables: {(sequence, sequence)} Already compiled forward and backward
+                       routing tables of the wiring, compiled if None
         """
         self.__label = label
         self._charset = charset
@@ -438,18 +495,33 @@ class _Component:  # Base component
             raise ValueError("Wiring must be the same length as the charset!")
 
         self._wiring = wiring
+        if tables is None:
+            self._compile()
+        else:
+            self._index = {char: i for i, char in enumerate(self._charset)}
+            self._forward_table, self._backward_table = tables
+
+    def _compile(self):
+        """Builds integer routing tables from the current wiring, must be called
+        every time the wiring changes
+        """
+        self._index = {char: i for i, char in enumerate(self._charset)}
+        self._forward_table = [self._index[char] for char in self._wiring]
+        self._backward_table = [0] * self._max_index
+        for i, output in enumerate(self._forward_table):
+            self._backward_table[output] = i
 
     def _forward(self, character):
         """Routes character from front to back
         :param character: {str}
         """
-        return self._wiring[self._charset.index(character)]
+        return self._charset[self._forward_table[self._index[character]]]
 
     def _backward(self, character):
         """Routes character from back to front
         :param character: {str}
         """
-        return self._charset[self._wiring.index(character)]
+        return self._charset[self._backward_table[self._index[character]]]
 
     def label(self):
         """Returns component label"""
@@ -459,13 +531,14 @@ class _Component:  # Base component
 class Stator(_Component):
     """Static entry point component to the rotor assembly"""
 
-    def __init__(self, wiring, charset=ALPHABET):
+    def __init__(self, wiring, charset=ALPHABET, tables=None):
         """
         :param wiring: {str} defines the way letters are routed
                              trough the rotor
         :param charset: {str} Stator charset
+        :param tables: {(sequence, sequence)} Compiled routing tables
         """
-        super().__init__("ETW", wiring, charset=charset)
+        super().__init__("ETW", wiring, charset=charset, tables=tables)
 
     def forward(self, letter):
         """Routes character from front to back
@@ -479,6 +552,18 @@ class Stator(_Component):
         """
         return super()._backward(letter)
 
+    def forward_index(self, index):
+        """Routes charset index from front to back
+        :param index: {int}
+        """
+        return self._forward_table[index]
+
+    def backward_index(self, index):
+        """Routes charset index from back to front
+        :param index: {int}
+        """
+        return self._backward_table[index]
+
     def __str__(self):
         return (
             "Stator with label "
@@ -493,13 +578,14 @@ class Stator(_Component):
 class _Rotatable(_Component):
     """Adds the capability of rotation, turnovers and ring settings to the rotor"""
 
-    def __init__(self, label, wiring, charset=ALPHABET):
+    def __init__(self, label, wiring, charset=ALPHABET, tables=None):
         """
         :param label: {str} Component label
         :param wiring: {str} Component wiring
         :param charset: {str} Component character set
+        :param tables: {(sequence, sequence)} Compiled routing tables
         """
-        super().__init__(label, wiring, charset=charset)
+        super().__init__(label, wiring, charset=charset, tables=tables)
 
         self._offset = 0
 
@@ -533,14 +619,15 @@ class _Rotatable(_Component):
 class Reflector(_Rotatable):
     """Component that only has a single way of routing letters"""
 
-    def __init__(self, label, wiring, rotatable=False, charset=ALPHABET):
+    def __init__(self, label, wiring, rotatable=False, charset=ALPHABET, tables=None):
         """
         :param label: {str} Component label
         :param wiring: {str} Component wiring
         :param rotatable: {bool} Whether or not this reflector can change positions
         :param charset: {str} Component character set
+        :param tables: {(sequence, sequence)} Compiled routing tables
         """
-        super().__init__(label, wiring, charset)
+        super().__init__(label, wiring, charset, tables)
 
         self.__rotatable = rotatable
 
@@ -553,12 +640,15 @@ class Reflector(_Rotatable):
         :param letter: {char}
         :return: {char}
         """
-        rel_input = (
-            self._charset.index(letter) + self._offset
-        ) % self._max_index  # INT
-        rel_result = self._charset.index(self._wiring[rel_input])  # INT
-        abs_result = (rel_result - self._offset) % self._max_index
-        return self._charset[abs_result]
+        return self._charset[self.reflect_index(self._index[letter])]
+
+    def reflect_index(self, index):
+        """Reflects charset index sending it backwards into the 3 rotors
+        :param index: {int}
+        :return: {int}
+        """
+        rel_input = (index + self._offset) % self._max_index
+        return (self._forward_table[rel_input] - self._offset) % self._max_index
 
     def offset(self, offset=None):
         """Returns offset if parameter isn't set, otherwise sets reflector offset
@@ -641,6 +731,7 @@ class UKWD(Reflector):
 
             # Creates a wiring table just like a normal reflector has
             self._wiring = "".join(wiring)
+            self._compile()
         else:
             # Reconstructs the original pairs and returns them
             new_reflector_pairs = []
@@ -648,7 +739,7 @@ class UKWD(Reflector):
                 if letter in "AN":
                     continue
 
-                pair = self.__marking[i] + self.__marking[self._charset.index(letter)]
+                pair = self.__marking[i] + self.__marking[self._index[letter]]
                 if not contains(new_reflector_pairs, pair):
                     new_reflector_pairs.append(pair)
 
@@ -668,18 +759,21 @@ class UKWD(Reflector):
 class Rotor(_Rotatable):
     """Critical component, can rotate and route letters back and forth"""
 
-    def __init__(self, label, wiring, turnover=None, charset=ALPHABET):
+    def __init__(self, label, wiring, turnover=None, charset=ALPHABET, tables=None):
         """
         :param label: {str} rotor label (I, II, III, ...)
         :param wiring: {str} defines the way letters are routed trough the rotor
         :param turnover: {str} or {[char, char]} All positions on which the
                          next rotor should be turned
         :param charset: {str} Rotor charset
+        :param tables: {(sequence, sequence)} Compiled routing tables
         """
-        super().__init__(label, wiring, charset)
+        super().__init__(label, wiring, charset, tables)
 
         self._turnover = turnover
         self._ring_offset = 0
+        # Turnover flag of every offset, avoids formatting positions when stepping
+        self._notches = [bool(turnover) and char in turnover for char in self._charset]
 
     def _adjusted_offset(self):
         """Offset adjusted for possible ring setting change"""
@@ -690,24 +784,32 @@ class Rotor(_Rotatable):
         :param letter: {char}
         :return: {char}
         """
-        rel_input = (
-            self._charset.index(letter) + self._adjusted_offset()
-        ) % self._max_index  # INT
-        rel_result = self._charset.index(self._wiring[rel_input])  # INT
-        return self._charset[(rel_result - self._adjusted_offset()) % self._max_index]
+        return self._charset[self.forward_index(self._index[letter])]
 
     def backward(self, letter):
         """Routes the letter from the back board to the front board
         :param letter: {char}
         :return: {char}
         """
-        rel_input = (
-            self._charset.index(letter) + self._adjusted_offset()
-        ) % self._max_index  # INT
-        rel_result = (
-            self._wiring.index(self._charset[rel_input]) - self._adjusted_offset()
-        ) % self._max_index  # INT
-        return self._charset[rel_result]
+        return self._charset[self.backward_index(self._index[letter])]
+
+    def forward_index(self, index):
+        """Routes charset index from the front board to the back board
+        :param index: {int}
+        :return: {int}
+        """
+        offset = self._adjusted_offset()
+        rel_input = (index + offset) % self._max_index
+        return (self._forward_table[rel_input] - offset) % self._max_index
+
+    def backward_index(self, index):
+        """Routes charset index from the back board to the front board
+        :param index: {int}
+        :return: {int}
+        """
+        offset = self._adjusted_offset()
+        rel_input = (index + offset) % self._max_index
+        return (self._backward_table[rel_input] - offset) % self._max_index
 
     def ring_offset(self, offset=None):
         """Sets "Ringstellung" (ring settings) which can be misaligned with internal wiring
@@ -720,11 +822,17 @@ class Rotor(_Rotatable):
         else:
             return self._ring_offset + 1
 
+    def turnover_offsets(self):
+        """Returns all offsets on which the next rotor should be turned
+        :return: {(int, int, ...)}
+        """
+        return tuple(i for i, notch in enumerate(self._notches) if notch)
+
     def in_turnover(self):
         """Returns True if the rotor is in turnover position else False
         :return: {bool} True if the rotor is in turnover position else False
         """
-        return self.position() in self._turnover
+        return self._notches[self._offset]
 
     def __str__(self):
         msg = (
@@ -760,6 +868,7 @@ class Enigma:
             rotatable_ref=False,
             numeric=False,
             charset=ALPHABET,
+            cache_size=0,
     ):
         """
         :param reflector: {Reflector} Reflector object
@@ -772,11 +881,32 @@ class Enigma:
         :param rotatable_ref: {bool} Enables reflector rotatability if True
         :param numeric: {bool} Enables numeric position display if True
         :param charset: {str} Character set used by Enigma and subcomponents
+        :param cache_size: {int} Maximum number of substitutions memoized per
+                                 rotor position, 0 disables the cache
         """
         self.__model = model
         self.__rotor_n = rotor_n
         self._charset = charset
 
+        # SUBSTITUTION CACHE
+        self._revision = 0  # Incremented on every change of settings
+        self.__cache = OrderedDict()
+        self.__cache_size = 0
+        self.substitution_cache(cache_size)
+
+        # STEPPING JUMP TABLES
+        self.__jumps = []
+        self.__jumps_key = None
+
+        # STEPPING STATE TABLE
+        self.__next_states = None  # Compiled only when enabled
+
+        # COMPOSITE OF THE SLOW ROTORS AND REFLECTOR
+        self.__inner = []  # Rotors left of the middle rotor and the reflector
+        self.__inner_key = None
+        self.__core = []  # Inner part wrapped in the middle rotor
+        self.__core_offset = None
+
         # COMPONENTS
         self._reflector = reflector
         self._rotors = []
@@ -786,11 +916,11 @@ class Enigma:
 
         # PLUGBOARD AND UHR
 
-        self._plugboard = Plugboard(plug_pairs) if plugboard else None
+        self._plugboard = Plugboard(plug_pairs, charset) if plugboard else None
         if self._plugboard is None:
-            self._plugboard_route = lambda letter, _=None: letter
+            self._plugboard_route = lambda index, _=None: index
         else:
-            self._plugboard_route = lambda letter, _=None: self._plugboard.route(letter)
+            self._plugboard_route = self._plugboard.route_index
         self._storage = Uhr()  # Stores currently unused object
         self._numeric = numeric
 
@@ -806,32 +936,289 @@ class Enigma:
         :param key: {char} Character to encrypt
         :return: {char} Encrypted character
         """
-        if key not in self.charset():
+        if len(key) != 1 or key not in self._charset:
             raise ValueError("This Enigma instance does not have a '%s' key!" % key)
 
-        if self._rotors[-1].in_turnover():
-            self._rotors[-2].rotate()
-        if self._rotors[-2].in_turnover():
-            self._rotors[-2].rotate()
-            self._rotors[-3].rotate()
-        self._rotors[-1].rotate()
+        return self._charset[self.press_index(self._charset.index(key))]
 
-        output = self._plugboard_route(key)
-        output = self._stator.forward(output)
+    def press_index(self, index):
+        """Simulates effects of pressing an Enigma key identified by its charset
+        index, the signal is routed as an integer the whole way trough
+        :param index: {int} Charset index of the key to encrypt
+        :return: {int} Charset index of the encrypted key
+        """
+        if not 0 <= index < len(self._charset):
+            raise ValueError("This Enigma instance does not have a key with index %d!" % index)
+
+        self._step()
+        if self.__cache_size:
+            return self._substitution()[index]
+        return self._route(index)
+
+    def encrypt_indices(self, indices):
+        """Encrypts a sequence of charset indexes
+        :param indices: {iterable} Charset indexes of the keys to encrypt
+        :return: {[int, int, ...]} Charset indexes of the encrypted keys
+        """
+        press_index = self.press_index
+        return [press_index(index) for index in indices]
+
+    def _step(self):
+        """Steps the rotors the way a single key press would"""
+        left, middle, right = self._rotors[-3], self._rotors[-2], self._rotors[-1]
+        if self.__next_states is not None:
+            size = right._max_index
+            left._offset, middle._offset, right._offset = self.__next_states[
+                (left._offset * size + middle._offset) * size + right._offset
+            ]
+            return
+
+        if right._notches[right._offset]:
+            middle.rotate()
+        if middle._notches[middle._offset]:
+            middle.rotate()
+            left.rotate()
+        right.rotate()
+
+    def compiled_stepping(self, enabled=None):
+        """Compiled stepping getter/setter, when enabled the successor of every
+        state of the three stepping rotors is compiled for the current wheel order
+        so that a key press steps the rotors with a single table lookup
+        :param enabled: {bool} Enables the table if True, discards it if False
+        """
+        if enabled is None:
+            return self.__next_states is not None
+
+        self.__next_states = self.__compile_next_states() if enabled else None
+
+    def __compile_next_states(self):
+        """Compiles offsets of the stepping rotors following each of their states
+        :return: {[(int, int, int), ...]} Left, middle and right rotor offsets
+                 indexed by the packed state (left * size + middle) * size + right
+        """
+        size = len(self._charset)
+        middle, right = self._rotors[-2:]
+        middle_notches = set(middle.turnover_offsets())
+        right_notches = set(right.turnover_offsets())
+
+        successors = [
+            step_offsets(m_offset, r_offset, middle_notches, right_notches, size)
+            for m_offset in range(size) for r_offset in range(size)
+        ]
+        return [
+            ((l_offset + left_step) % size, new_m, new_r)
+            for l_offset in range(size) for left_step, new_m, new_r in successors
+        ]
+
+    def _jump_tables(self, level):
+        """Returns stepping jump tables for 2 ** level key presses. The middle and
+        right rotor only depend on each other, so each table maps their packed
+        offsets to the offsets 2 ** level key presses later and to the number of
+        times the left rotor steps in between.
+        :param level: {int} Power of two of the key press count
+        :return: {([int, ...], [int, ...])} Packed successors and left rotor steps
+        """
+        size = len(self._charset)
+        middle, right = self._rotors[-2:]
+        key = (middle.turnover_offsets(), right.turnover_offsets(), size)
+
+        if key != self.__jumps_key:
+            middle_notches, right_notches = set(key[0]), set(key[1])
+            successors, carries = [], []
+            for m_offset in range(size):
+                for r_offset in range(size):
+                    carry, new_m, new_r = step_offsets(
+                        m_offset, r_offset, middle_notches, right_notches, size
+                    )
+                    successors.append(new_m * size + new_r)
+                    carries.append(carry)
+
+            self.__jumps = [(successors, carries)]
+            self.__jumps_key = key
+
+        while len(self.__jumps) <= level:
+            successors, carries = self.__jumps[-1]
+            self.__jumps.append((
+                [successors[state] for state in successors],
+                [carries[state] + carries[successors[state]] for state in range(len(carries))],
+            ))
+
+        return self.__jumps[level]
+
+    def _offsets_after(self, presses):
+        """Returns offsets of all rotors after select number of key presses, the
+        cost is logarithmic in the number of key presses
+        :param presses: {int} Number of key presses
+        :return: {[int, int, ...]} Rotor offsets
+        """
+        if not isinstance(presses, int) or presses < 0:
+            raise ValueError("Number of key presses must be a positive integer or 0!")
+
+        size = len(self._charset)
+        offsets = [rotor._offset for rotor in self._rotors]
+        state = offsets[-2] * size + offsets[-1]
+        left_steps = 0
+
+        level = 0
+        while presses:
+            if presses & 1:
+                successors, carries = self._jump_tables(level)
+                left_steps += carries[state]
+                state = successors[state]
+            presses >>= 1
+            level += 1
+
+        offsets[-3] = (offsets[-3] + left_steps) % size
+        offsets[-2], offsets[-1] = divmod(state, size)
+        return offsets
+
+    def state_after(self, presses):
+        """Returns rotor positions select number of key presses ahead without
+        changing the current positions
+        :param presses: {int} Number of key presses
+        :return: {tuple} Rotor positions in the same format as positions()
+        """
+        return tuple([
+            format_position(self._charset, offset + 1, self._numeric)
+            for offset in self._offsets_after(presses)
+        ])
+
+    def advance(self, presses):
+        """Sets rotors to positions they would have after select number of key
+        presses (the reflector never steps on its own and keeps its position)
+        :param presses: {int} Number of key presses
+        """
+        for rotor, offset in zip(self._rotors, self._offsets_after(presses)):
+            rotor._offset = offset
+
+    def offsets(self, new_offsets=None):
+        """Returns zero based offsets of all rotors if new_offsets is None, else
+        sets them, unlike positions the offsets are plain charset indexes
+        :param new_offsets: {iterable} Rotor offsets, first rotor first
+        """
+        if new_offsets is not None:
+            new_offsets = [int(offset) for offset in new_offsets]
+            if len(new_offsets) != len(self._rotors):
+                raise ValueError("Invalid number of offsets to set!")
+            if any(not 0 <= offset < len(self._charset) for offset in new_offsets):
+                raise ValueError("Offsets can only be set to charset indexes!")
+
+            for rotor, offset in zip(self._rotors, new_offsets):
+                rotor._offset = offset
+        else:
+            return tuple([rotor._offset for rotor in self._rotors])
+
+    def substitution(self):
+        """Returns the full substitution for the current rotor and reflector
+        positions without stepping the rotors
+        :return: {[int, int, ...]} Output charset index for each input index
+        """
+        return [self._route(index) for index in range(len(self._charset))]
 
-        for rotor in reversed(self._rotors):
-            output = rotor.forward(output)
+    def _route(self, index):
+        """Routes charset index trough all components without stepping the rotors
+        :param index: {int} Charset index entering the plugboard
+        :return: {int} Charset index leaving the plugboard
+        """
+        output = self._plugboard_route(index)
+        output = self._stator.forward_index(output)
 
-        output = self._reflector.reflect(output)
+        fast = self._rotors[-1]
+        output = fast.backward_index(self._core()[fast.forward_index(output)])
 
-        for rotor in self._rotors:
-            output = rotor.backward(output)
+        output = self._stator.backward_index(output)
 
-        output = self._stator.backward(output)
+        return self._plugboard_route(output, True)
 
-        output = self._plugboard_route(output, True)
+    def _core(self):
+        """Returns the composed permutation of all rotors except the fast one and
+        the reflector (slow rotors -> reflector -> slow rotors inverse). The part
+        left of the middle rotor is kept separately because it changes far less
+        often, each part is only recomputed when it moved or the settings changed.
+        :return: {[int, int, ...]} Output charset index for each input index
+        """
+        rotors = self._rotors
+        key = (self._revision, self._reflector._offset, rotors[-3]._offset)
+        if len(rotors) > 3:  # Non-stepping rotors can only be moved by hand
+            key += tuple([rotor._offset for rotor in rotors[:-3]])
+
+        if key != self.__inner_key:
+            inner = [self._reflector.reflect_index(index) for index in range(len(self._charset))]
+            for rotor in rotors[:-2]:  # From the reflector outwards
+                inner = _wrap(inner, rotor)
+            self.__inner = inner
+            self.__inner_key = key
+            self.__core_offset = None
+
+        if rotors[-2]._offset != self.__core_offset:
+            self.__core = _wrap(self.__inner, rotors[-2])
+            self.__core_offset = rotors[-2]._offset
+
+        return self.__core
+
+    def static_tables(self):
+        """Returns tables of the parts of the signal path that do not move while
+        typing: plugboard with stator on the way in, non-stepping rotors with the
+        reflector and stator with plugboard on the way out
+        :return: {([int, ...], [int, ...], [int, ...])} Entry, core and exit tables
+        """
+        size = len(self._charset)
+        static = self._rotors[:-3]
+
+        pre = [self._stator.forward_index(self._plugboard_route(i)) for i in range(size)]
+        post = [self._plugboard_route(self._stator.backward_index(i), True) for i in range(size)]
+        core = []
+        for index in range(size):
+            for rotor in reversed(static):
+                index = rotor.forward_index(index)
+            index = self._reflector.reflect_index(index)
+            for rotor in static:
+                index = rotor.backward_index(index)
+            core.append(index)
+
+        return pre, core, post
+
+    # SUBSTITUTION CACHE
+
+    def substitution_cache(self, size=None):
+        """Substitution cache size getter/setter, setting the size clears the cache
+        :param size: {int} Maximum number of memoized rotor position states,
+                           0 disables the cache
+        """
+        if size is not None:
+            if not isinstance(size, int) or size < 0:
+                raise ValueError("Substitution cache size must be a positive integer or 0!")
 
-        return output
+            self.__cache_size = size
+            self.__cache.clear()
+        else:
+            return self.__cache_size
+
+    def _invalidate(self):
+        """Discards all memoized substitutions and bumps the settings revision,
+        must be called whenever a setting other than the rotor or reflector
+        positions changes
+        """
+        self._revision += 1
+        self.__cache.clear()
+
+    def _substitution(self):
+        """Returns the full substitution for the current rotor and reflector
+        positions, computing it only if it is not memoized yet
+        :return: {[int, int, ...]} Output charset index for each input index
+        """
+        state = tuple(rotor._offset for rotor in self._rotors) + (self._reflector._offset,)
+
+        substitution = self.__cache.get(state)
+        if substitution is None:
+            substitution = self.substitution()
+            self.__cache[state] = substitution
+            if len(self.__cache) > self.__cache_size:
+                self.__cache.popitem(last=False)
+        else:
+            self.__cache.move_to_end(state)
+
+        return substitution
 
     # REFLECTOR
 
@@ -843,6 +1230,7 @@ class Enigma:
         """Reflector getter/setter"""
         if new_reflector:
             self._reflector = new_reflector
+            self._invalidate()
         else:
             return self._reflector.label()
 
@@ -851,6 +1239,8 @@ class Enigma:
         if self._reflector.label() != "UKW-D":
             raise ValueError("Only UKW-D reflector has wiring pairs!")
 
+        if new_pairs is not None:
+            self._invalidate()
         return self._reflector.reflector_pairs(new_pairs)
 
     def reflector_rotatable(self):
@@ -905,6 +1295,7 @@ class Enigma:
         if new_ring_settings:
             for setting, rotor in zip(new_ring_settings, self._rotors):
                 rotor.ring_offset(convert_position(setting, "ring setting"))
+            self._invalidate()
         else:
             return [rotor.ring_offset() for rotor in self._rotors]
 
@@ -915,6 +1306,9 @@ class Enigma:
                 raise ValueError("This Enigma has %d rotors!" % self.rotor_n())
 
             self._rotors = new_rotors
+            self._invalidate()
+            if self.__next_states is not None:
+                self.__next_states = self.__compile_next_states()
         else:
             return [rotor.label() for rotor in self._rotors]
 
@@ -923,6 +1317,8 @@ class Enigma:
     def plug_pairs(self, new_plug_pairs=None):
         """Plug pairs getter/setter"""
         if self._plugboard is not None:
+            if new_plug_pairs is not None:
+                self._invalidate()
             return self._plugboard.pairs(new_plug_pairs)
         raise ValueError("This Enigma model doesn't have a plugboard!")
 
@@ -938,14 +1334,16 @@ class Enigma:
             if isinstance(self._storage, Uhr):
                 self._storage, self._plugboard = self._plugboard, self._storage
                 self._plugboard.pairs([])
-                self._plugboard_route = self._plugboard.route
+                self._plugboard_route = self._plugboard.route_index
         elif action == "disconnect" and isinstance(self._plugboard, Uhr):
             self._storage, self._plugboard = self._plugboard, self._storage
             self._plugboard.pairs([])
-            self._plugboard_route = lambda letter, _=None: self._plugboard.route(letter)
+            self._plugboard_route = self._plugboard.route_index
         else:
             raise ValueError("Invalid action!")
 
+        self._invalidate()
+
     def uhr_position(self, new_position=None):
         """Uhr position getter/setter"""
         if not isinstance(self._plugboard, Uhr):
@@ -953,6 +1351,7 @@ class Enigma:
 
         if new_position is not None:
             self._plugboard.position(new_position)
+            self._invalidate()
         else:
             return self._plugboard.position()
 
@@ -25,6 +25,9 @@ class Uhr:
         self.__real_coords = []
 
         self.__offset = 0  # Scrambler disc offset
+        self.__index = {letter: i for i, letter in enumerate(ALPHABET)}
+        self.__tables = []  # (forward, backward) routing tables for each offset
+        self.__routes = None  # Routing tables of the current offset
 
         self.pairs(pairs)
 
@@ -33,6 +36,7 @@ class Uhr:
         :param offset_by: {int} By how many positions
         """
         self.__offset = (self.__offset + offset_by) % 40
+        self.__routes = self.__tables[self.__offset]
 
     def position(self, new_position=None):
         """Positions getter/setter, valid position range is 00 - 39"""
@@ -43,6 +47,7 @@ class Uhr:
                 raise ValueError("Uhr positions can only be set to values 00 - 39!")
 
             self.__offset = new_position
+            self.__routes = self.__tables[self.__offset]
         else:
             return self.__offset
 
@@ -66,6 +71,13 @@ class Uhr:
                 a_coords.append(("a", pair[0], self.__a_pairs[i], self.__a_pairs[i] + 2))
                 b_coords.append(("b", pair[1], self.__b_pairs[i], self.__b_pairs[i] + 2))
             self.__real_coords = {"a": a_coords, "b": b_coords}
+
+            self.__tables = [
+                tuple([self.__index[self.__trace(letter, backwards, offset)]
+                       for letter in ALPHABET] for backwards in (False, True))
+                for offset in range(40)
+            ]
+            self.__routes = self.__tables[self.__offset]
         else:
             return self.__pairs
 
@@ -75,11 +87,32 @@ class Uhr:
         :param backwards: {bool} Letters are wired differently
                           if backwards is True (returning from rotor assembly)
         """
+        index = self.__index.get(letter)
+        if index is None:
+            return letter  # Letters without a plug are not routed
+        return ALPHABET[self.__routes[backwards][index]]
+
+    def route_index(self, index, backwards=False):
+        """Routes charset index trough the Uhr
+        :param index: {int} Charset index to route
+        :param backwards: {bool} Letters are wired differently
+                          if backwards is True (returning from rotor assembly)
+        """
+        return self.__routes[backwards][index]
+
+    def __trace(self, letter, backwards, offset):
+        """Traces the letter trough Uhr wiring at select dial offset, used
+        to compile the routing tables
+        :param letter: {str} Letter to route
+        :param backwards: {bool} Letters are wired differently
+                          if backwards is True (returning from rotor assembly)
+        :param offset: {int} Scrambler disc offset
+        """
         board = None
         for plug in self.__real_coords["a"] + self.__real_coords["b"]:
             if plug[1] == letter:
                 board = "a" if plug[0] == "b" else "b"
-                send_pin = (plug[3 if backwards else 2] + self.__offset) % 40
+                send_pin = (plug[3 if backwards else 2] + offset) % 40
                 break
 
         if board == "a":
@@ -89,7 +122,7 @@ class Uhr:
         else:
             return letter  # Unconnected pairs are not routed
 
-        receive_pin = (receive_pin - self.__offset) % 40
+        receive_pin = (receive_pin - offset) % 40
 
         index = 2 if backwards else 3
         for plug in self.__real_coords[board]:
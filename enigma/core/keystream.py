@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""Precompiled keystream tables. For fixed settings the whole Enigma is just a
+substitution for each state of the three stepping rotors, compiling all of them
+turns encryption into a pure table walk."""
+
+from array import array
+from mmap import ACCESS_READ, mmap
+
+from enigma.core.components import step_offsets
+
+MAGIC = b"EKS1"  # Header of saved keystream files, followed by the charset length
+
+
+def _shifted(table, offset, size):
+    """Returns a routing table of a wheel turned by offset positions
+    :param table: {[int, int, ...]} Routing table of the wheel in position 0
+    :param offset: {int} Wheel offset (adjusted for ring setting)
+    :param size: {int} Charset length
+    """
+    return [(table[(i + offset) % size] - offset) % size for i in range(size)]
+
+
+def _rotor_tables(rotor, offset):
+    """Returns forward and backward routing tables of a rotor at select offset
+    :param rotor: {Rotor} Rotor to route through
+    :param offset: {int} Rotor offset (not adjusted for ring setting)
+    """
+    size = rotor._max_index
+    adjusted = (offset - rotor._ring_offset) % size
+    return (_shifted(rotor._forward_table, adjusted, size),
+            _shifted(rotor._backward_table, adjusted, size))
+
+
+class Keystream:
+    """Substitutions of all stepping rotor states for fixed Enigma settings"""
+
+    def __init__(self, enigma):
+        """Compiles substitution and successor tables for all states of the three
+        stepping rotors, all other settings (including positions of the
+        non-stepping rotors and reflector) are taken from the supplied Enigma
+        :param enigma: {Enigma} Enigma to compile tables for
+        """
+        self._size = size = len(enigma.charset())
+        self._key = self.settings_key(enigma)
+
+        left, middle, right = enigma._rotors[-3:]
+
+        # Plugboard, stator, non-stepping rotors and reflector are the same for all states
+        pre, core, post = enigma.static_tables()
+
+        middles = [_rotor_tables(middle, offset) for offset in range(size)]
+        rights = []
+        for offset in range(size):
+            forward, backward = _rotor_tables(right, offset)
+            rights.append(([forward[i] for i in pre], [post[i] for i in backward]))
+
+        self._table = table = array("B")
+        for l_offset in range(size):
+            forward, backward = _rotor_tables(left, l_offset)
+            left_core = [backward[core[i]] for i in forward]
+            for m_forward, m_backward in middles:
+                inner = [m_backward[left_core[i]] for i in m_forward]
+                for r_forward, r_backward in rights:
+                    table.extend([r_backward[inner[i]] for i in r_forward])
+
+        # Successor of every state
+        m_notches = set(middle.turnover_offsets())
+        r_notches = set(right.turnover_offsets())
+
+        self._next = successors = array("L")
+        for l_offset in range(size):
+            for m_offset in range(size):
+                for r_offset in range(size):
+                    l_step, new_m, new_r = step_offsets(
+                        m_offset, r_offset, m_notches, r_notches, size
+                    )
+                    new_l = (l_offset + l_step) % size
+                    successors.append((new_l * size + new_m) * size + new_r)
+
+    def save(self, file):
+        """Writes the tables to a binary file
+        :param file: {file} File object opened for binary writing
+        """
+        file.write(MAGIC + bytes([self._size]))
+        file.write(self._table.tobytes())
+        file.write(array("I", self._next).tobytes())
+
+    @classmethod
+    def load(cls, filename, enigma):
+        """Loads tables saved by save trough a read-only memory map, so processes
+        loading the same file share its memory
+        :param filename: {str} Path to the saved tables
+        :param enigma: {Enigma} Enigma with the settings the tables were compiled for
+        :return: {Keystream}
+        """
+        with open(filename, "rb") as file:
+            data = mmap(file.fileno(), 0, access=ACCESS_READ)
+
+        size = len(enigma.charset())
+        header = len(MAGIC) + 1
+        table_end = header + size ** 4
+        if data[:header] != MAGIC + bytes([size]) or \
+                len(data) != table_end + size ** 3 * array("I").itemsize:
+            data.close()
+            raise ValueError("File '%s' does not contain keystream tables!" % filename)
+
+        keystream = cls.__new__(cls)
+        keystream._size = size
+        keystream._key = cls.settings_key(enigma)
+        keystream._table = memoryview(data)[header:table_end]
+        keystream._next = memoryview(data)[table_end:].cast("I")
+        return keystream
+
+    @staticmethod
+    def settings_key(enigma):
+        """Returns a value that changes whenever the compiled tables of an Enigma
+        become invalid (anything except the stepping rotor positions changes)
+        :param enigma: {Enigma}
+        """
+        return (
+            enigma._revision,
+            tuple(rotor._offset for rotor in enigma._rotors[:-3]),
+            enigma._reflector._offset,
+        )
+
+    def valid_for(self, enigma):
+        """Returns True if the tables were compiled for the current Enigma settings
+        :param enigma: {Enigma}
+        """
+        return self._key == self.settings_key(enigma)
+
+    def size(self):
+        """Returns the charset length the tables were compiled for"""
+        return self._size
+
+    def table(self):
+        """Returns the substitution table, the encrypted charset index of index i
+        in state s is at s * size + i
+        :return: {array} Unsigned byte array
+        """
+        return self._table
+
+    def successors(self):
+        """Returns the successor table with the state after a key press in every state
+        :return: {array} Unsigned long array
+        """
+        return self._next
+
+    def state(self, enigma):
+        """Packs positions of the three stepping rotors to a single state index
+        :param enigma: {Enigma}
+        :return: {int}
+        """
+        left, middle, right = enigma.offsets()[-3:]
+        return (left * self._size + middle) * self._size + right
+
+    def unpack(self, state):
+        """Unpacks state index to stepping rotor offsets
+        :param state: {int}
+        :return: {(int, int, int)} Left, middle and right rotor offset
+        """
+        left, rest = divmod(state, self._size * self._size)
+        return (left,) + divmod(rest, self._size)
+
+    def load_state(self, enigma, state):
+        """Sets stepping rotors of the Enigma to the positions of the state
+        :param enigma: {Enigma}
+        :param state: {int}
+        """
+        enigma.offsets(enigma.offsets()[:-3] + self.unpack(state))
+
+    def walk(self, state, indices):
+        """Encrypts charset indexes starting from the state, exactly as if each of
+        them was pressed on the Enigma
+        :param state: {int} Starting state index
+        :param indices: {iterable} Charset indexes to encrypt
+        :return: {([int, ...], [int, ...])} Encrypted indexes and the state after
+                                           each key press
+        """
+        table, successors, size = self._table, self._next, self._size
+        output, states = [], []
+        for index in indices:
+            state = successors[state]
+            output.append(table[state * size + index])
+            states.append(state)
+        return output, states
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Component routing tables in shared memory. Tables of all rotors, reflectors
+and stators of select models are compiled into a single block once, worker
+processes attach to the block by name and build components on top of
+read-only views of it instead of compiling their own tables."""
+
+import json
+from multiprocessing import shared_memory
+
+from enigma.core.components import HISTORICAL, _Component
+
+_attached = None  # Tables attached to by this process
+
+
+def attach(name):
+    """Attaches this process to shared tables, components generated by the
+    EnigmaAPI use them from now on (used as a process pool initializer). The
+    block stays attached for the lifetime of the process because components
+    may still hold views of it.
+    :param name: {str} Name of the shared memory block
+    """
+    global _attached  # pylint: disable=global-statement
+    if _attached is None or _attached.name() != name:
+        _attached = SharedTables(name)
+
+
+def attached():
+    """Returns shared tables this process is attached to or None"""
+    return _attached
+
+
+class SharedTables:
+    """Compiled routing tables of all components of select models in a shared
+    memory block. The block starts with the length of a JSON index (4 bytes),
+    followed by the index and the forward and backward table of each component,
+    the index holds offsets of the tables relative to the end of the index."""
+
+    def __init__(self, name=None, models=None):
+        """Creates a new block if name is None, else attaches to an existing one
+        :param name: {str} Name of the block to attach to
+        :param models: {[str, str, ...]} Models to compile tables of when creating
+                                         a block, all models by default
+        """
+        if name is None:
+            self.__memory = self.__create(models)
+            self.__owner = True
+        else:
+            try:  # Only the creator is responsible for freeing the block
+                self.__memory = shared_memory.SharedMemory(name, track=False)
+            except TypeError:  # Before Python 3.13, processes started by the
+                # creator share its resource tracker, so it is tracked only once
+                self.__memory = shared_memory.SharedMemory(name)
+            self.__owner = False
+
+        buffer = self.__memory.buf.toreadonly()
+        length = int.from_bytes(buffer[:4], "little")
+        self.__index = json.loads(bytes(buffer[4:4 + length]).decode("utf-8"))
+        self.__buffer = buffer[4 + length:]  # Index offsets start after the header
+        buffer.release()
+
+    @staticmethod
+    def __create(models):
+        """Compiles tables of the models into a new shared memory block
+        :param models: {[str, str, ...]} Models to compile tables of
+        """
+        index, tables = {}, bytearray()
+        for model in HISTORICAL if models is None else models:
+            data = HISTORICAL[model]
+            components = [("stator", data["stator"])]
+            for comp_type in ("rotors", "reflectors"):
+                components += [(comp_type, component) for component in data[comp_type]
+                               if component["label"] != "UKW-D"]  # Rewirable
+
+            model_index = index[model] = {"size": len(data["charset"])}
+            for comp_type, component in components:
+                compiled = _Component(
+                    component.get("label", "ETW"), component["wiring"], data["charset"]
+                )
+                label = component.get("label", comp_type)
+                model_index.setdefault(comp_type, {})[label] = len(tables)
+                tables += bytes(compiled._forward_table) + bytes(compiled._backward_table)
+
+        header = json.dumps(index).encode("utf-8")
+        header = len(header).to_bytes(4, "little") + header
+
+        memory = shared_memory.SharedMemory(create=True, size=len(header) + len(tables))
+        memory.buf[:len(header)] = header
+        memory.buf[len(header):len(header) + len(tables)] = tables
+        return memory
+
+    def name(self):
+        """Returns name of the shared memory block"""
+        return self.__memory.name
+
+    def tables(self, model, comp_type, label=None):
+        """Returns views of the forward and backward table of a component
+        :param model: {str} Enigma model
+        :param comp_type: {str} "stator", "rotors" or "reflectors"
+        :param label: {str} Component label (not used for stators)
+        :return: {(memoryview, memoryview)} or None if the tables are not shared
+        """
+        model_index = self.__index.get(model)
+        if model_index is None:
+            return None
+
+        labels = model_index.get(comp_type, {})
+        start = labels.get("stator" if comp_type == "stator" else label)
+        if start is None:
+            return None
+
+        size = model_index["size"]
+        return (self.__buffer[start:start + size],
+                self.__buffer[start + size:start + 2 * size])
+
+    def close(self):
+        """Detaches from the block and frees it if this instance created it,
+        components using the tables must not be used afterwards"""
+        self.__buffer.release()
+        self.__memory.close()
+        if self.__owner:
+            self.__memory.unlink()
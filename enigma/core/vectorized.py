@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""NumPy implementation of the Enigma signal path, encrypts whole messages with
+array operations instead of pressing keys one by one. NumPy is optional, np is
+None if it is not installed."""
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def _shift(table, offsets, signal, size, rows=None):
+    """Routes signal trough a wheel with a different offset for every key press
+    :param table: {np.ndarray} Routing table of the wheel in position 0
+    :param offsets: {np.ndarray} Wheel offsets (adjusted for ring setting)
+    :param signal: {np.ndarray} Charset indexes entering the wheel
+    :param size: {int} Charset length
+    :param rows: {np.ndarray} Row of the table to use for each row of signal if
+                              table holds a wheel for each machine of a batch
+    """
+    index = (signal + offsets) % size
+    return ((table[index] if rows is None else table[rows, index]) - offsets) % size
+
+
+def _static_tables(enigma):
+    """Returns Enigma.static_tables as arrays
+    :param enigma: {Enigma}
+    :return: {(np.ndarray, np.ndarray, np.ndarray)} Entry, core and exit tables
+    """
+    return tuple(np.array(table, dtype=np.intp) for table in enigma.static_tables())
+
+
+def stepping_offsets(enigma, length):
+    """Returns offsets of the three stepping rotors after each of select number of
+    key presses. The middle and right rotor are eventually periodic with a period
+    of at most size ** 2, so only one period is simulated and then repeated.
+    :param enigma: {Enigma} Enigma in the starting position
+    :param length: {int} Number of key presses
+    :return: {(np.ndarray, np.ndarray, np.ndarray)} Left, middle and right offsets
+    """
+    size = len(enigma.charset())
+    successors, carries = enigma._jump_tables(0)
+    left, middle, right = [rotor._offset for rotor in enigma._rotors[-3:]]
+
+    # Walks packed middle and right offsets until a state repeats
+    path, seen = [], {}
+    state = middle * size + right
+    while state not in seen and len(path) <= length:
+        seen[state] = len(path)
+        path.append(state)
+        state = successors[state]
+
+    path = np.array(path, dtype=np.intp)
+    presses = np.arange(1, length + 1)
+    if state in seen:  # Indexes past the first repeat wrap around the cycle
+        start = seen[state]
+        presses = np.where(
+            presses < start, presses, start + (presses - start) % (len(path) - start)
+        )
+    states = path[presses]
+
+    # Left rotor steps on the transition into each state
+    previous = np.concatenate(([path[0]], states[:-1]))
+    left_steps = np.cumsum(np.array(carries, dtype=np.intp)[previous])
+
+    return (left + left_steps) % size, states // size, states % size
+
+
+def encrypt_array(enigma, indices):
+    """Encrypts charset indexes exactly as if each of them was pressed on the
+    Enigma, the rotors are left in the position after the last key press
+    :param enigma: {Enigma} Enigma to encrypt with
+    :param indices: {np.ndarray} Charset indexes to encrypt
+    :return: {(np.ndarray, (np.ndarray, np.ndarray, np.ndarray))} Encrypted
+             uint8 charset indexes and stepping rotor offsets after each press
+    """
+    size = len(enigma.charset())
+    signal = np.asarray(indices, dtype=np.intp).ravel()
+    if signal.size and (signal.min() < 0 or signal.max() >= size):
+        raise ValueError("This Enigma instance only has keys with indexes 0 - %d!" % (size - 1))
+
+    shape = np.shape(indices)
+    if not signal.size:
+        return np.zeros(shape, dtype=np.uint8), (signal, signal, signal)
+
+    stepping = stepping_offsets(enigma, signal.size)
+    rotors = enigma._rotors[-3:]
+    pre, core, post = _static_tables(enigma)
+
+    adjusted = [(offsets - rotor._ring_offset) % size for offsets, rotor in zip(stepping, rotors)]
+
+    signal = pre[signal]
+    for rotor, offsets in reversed(list(zip(rotors, adjusted))):
+        signal = _shift(np.array(rotor._forward_table, dtype=np.intp), offsets, signal, size)
+    signal = core[signal]
+    for rotor, offsets in zip(rotors, adjusted):
+        signal = _shift(np.array(rotor._backward_table, dtype=np.intp), offsets, signal, size)
+    signal = post[signal]
+
+    for rotor, offsets in zip(rotors, stepping):
+        rotor._offset = int(offsets[-1])
+
+    return signal.astype(np.uint8).reshape(shape), stepping
+
+
+def encrypt_batch(enigmas, indices):
+    """Encrypts charset indexes with many machines of the same model at once, all
+    machines are stepped in lockstep and their positions are left unchanged
+    :param enigmas: {[Enigma, Enigma, ...]} Machines of the same model in their
+                                           starting positions
+    :param indices: {np.ndarray} Charset indexes to encrypt, either one text for
+                                 all machines or one row of indexes per machine
+    :return: {np.ndarray} uint8 array of encrypted charset indexes with one row
+             per machine
+    """
+    enigmas = list(enigmas)
+    if len({enigma.model() for enigma in enigmas}) > 1:
+        raise ValueError("All Enigma instances of a batch must be of the same model!")
+
+    signal = np.asarray(indices, dtype=np.intp)
+    if signal.ndim == 1:
+        signal = np.broadcast_to(signal, (len(enigmas), signal.size))
+    elif signal.ndim != 2 or signal.shape[0] != len(enigmas):
+        raise ValueError("Batch indexes must be one text or one text per Enigma instance!")
+
+    if not signal.size:
+        return np.zeros(signal.shape, dtype=np.uint8)
+
+    size = len(enigmas[0].charset())
+    if signal.min() < 0 or signal.max() >= size:
+        raise ValueError("This Enigma model only has keys with indexes 0 - %d!" % (size - 1))
+
+    keys, length = signal.shape
+    rows = np.arange(keys)
+    rotors = [enigma._rotors[-3:] for enigma in enigmas]
+    tables = [np.array(table) for table in zip(*[_static_tables(enigma) for enigma in enigmas])]
+
+    notches = np.zeros((2, keys, size), dtype=np.intp)
+    for key, (_, middle, right) in enumerate(rotors):
+        notches[0, key, list(middle.turnover_offsets())] = 1
+        notches[1, key, list(right.turnover_offsets())] = 1
+
+    # Steps all machines at once, same rules as components.step_offsets
+    left, middle, right = np.array([[rotor._offset for rotor in wheels]
+                                    for wheels in rotors], dtype=np.intp).T
+    stepping = np.empty((3, keys, length), dtype=np.intp)
+    for press in range(length):
+        middle = (middle + notches[1, rows, right]) % size
+        carry = notches[0, rows, middle]
+        middle = (middle + carry) % size
+        left = (left + carry) % size
+        right = (right + 1) % size
+        stepping[:, :, press] = left, middle, right
+
+    rings = np.array([[rotor._ring_offset for rotor in wheels] for wheels in rotors],
+                     dtype=np.intp)
+    adjusted = (stepping - rings.T[:, :, None]) % size
+    forward = [np.array([wheels[slot]._forward_table for wheels in rotors], dtype=np.intp)
+               for slot in range(3)]
+    backward = [np.array([wheels[slot]._backward_table for wheels in rotors], dtype=np.intp)
+                for slot in range(3)]
+
+    rows = rows[:, None]
+    signal = tables[0][rows, signal]
+    for slot in reversed(range(3)):
+        signal = _shift(forward[slot], adjusted[slot], signal, size, rows)
+    signal = tables[1][rows, signal]
+    for slot in range(3):
+        signal = _shift(backward[slot], adjusted[slot], signal, size, rows)
+    signal = tables[2][rows, signal]
+
+    return signal.astype(np.uint8)
@@ -3,6 +3,14 @@
 supplied enigma_api object."""
 
 import logging
+from json import dumps
+from re import compile as re_compile
+from re import escape
+from sys import stdin, stdout
+
+from enigma.api.batch import run_batch
+
+CHUNK_SIZE = 65536  # Characters read from the input at a time in stream mode
 
 
 def cli(enigma_api, args, msg=None):
@@ -22,7 +30,7 @@ def cli(enigma_api, args, msg=None):
         msg = (args.message[0] if msg is None else msg).upper()
 
     try:
-        msg = enigma_api.encrypt(msg)
+        msg = enigma_api.encrypt(msg, parallel=args.workers)
     except ValueError as err:
         print(err)
         exit(1)
@@ -37,3 +45,103 @@ def cli(enigma_api, args, msg=None):
 
     if not args.silent:
         print()
+
+
+def read_chunks(source, charset, chunk_size=CHUNK_SIZE):
+    """Reads source in fixed-size chunks, uppercases them and removes all
+    characters that are not in the charset
+    :param source: {file} Text file object to read from
+    :param charset: {str} Characters to keep
+    :param chunk_size: {int} Number of characters read at a time
+    """
+    invalid = re_compile("[^%s]+" % escape(charset))
+    for chunk in iter(lambda: source.read(chunk_size), ""):
+        chunk = invalid.sub("", chunk.upper())
+        if chunk:
+            yield chunk
+
+
+def stream(enigma_api, args):
+    """Encrypts input from a file or stdin chunk by chunk, writing encrypted chunks
+    to a file or stdout as they are produced so memory usage stays flat
+    :param enigma_api: {EnigmaAPI}
+    :param args: Object containing parsed command line arguments
+    """
+    source, target = stdin, stdout
+    length = 0
+    try:
+        try:
+            if args.input:
+                source = open(args.input[0], "r")
+            if args.output:
+                target = open(args.output[0], "w")
+        except OSError as err:
+            print(err)
+            exit(1)
+
+        for encrypted in enigma_api.encrypt_stream(read_chunks(source, enigma_api.charset())):
+            target.write(encrypted)
+            length += len(encrypted)
+    finally:
+        if source is not stdin:
+            source.close()
+        if target is not stdout:
+            target.close()
+
+    logging.info("Successfully encrypted %d letters, quitting stream mode..." % length)
+
+
+def mapped(enigma_api, args):
+    """Encrypts the input file trough memory maps, writing the encrypted file
+    to the output file or back to the input file if no output is supplied
+    :param enigma_api: {EnigmaAPI}
+    :param args: Object containing parsed command line arguments
+    """
+    if not args.input:
+        if not args.silent:
+            print("Supply file to encrypt with --in FILE argument!")
+        logging.error("No file to encrypt, quitting...")
+        exit(1)
+
+    try:
+        length = enigma_api.encrypt_file(
+            args.input[0], args.output[0] if args.output else None
+        )
+    except (OSError, ValueError) as err:
+        print(err)
+        exit(1)
+
+    if not args.silent:
+        print(enigma_api)
+
+    logging.info("Successfully encrypted %d letters, quitting mmap mode..." % length)
+
+
+def batch(args):
+    """Encrypts jobs from a JSONL file, each line holds settings in the
+    EnigmaAPI.get_config format and a "message" key, results are written
+    as JSONL to a file or stdout in the order of the jobs
+    :param args: Object containing parsed command line arguments
+    """
+    source, target = None, stdout
+    jobs = failed = 0
+    try:
+        try:
+            source = open(args.batch[0], "r")
+            if args.output:
+                target = open(args.output[0], "w")
+        except OSError as err:
+            print(err)
+            exit(1)
+
+        for result in run_batch(source, args.workers):
+            target.write(dumps(result) + "\n")
+            jobs += 1
+            failed += "error" in result
+    finally:
+        if source is not None:
+            source.close()
+        if target is not stdout:
+            target.close()
+
+    logging.info("Processed %d jobs (%d failed), quitting batch mode..." % (jobs, failed))
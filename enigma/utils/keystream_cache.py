@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Directory of compiled keystream tables shared between processes, tables are
+stored in files named by a hash of the settings they were compiled for."""
+
+import json
+import logging
+import os
+from hashlib import sha256
+from tempfile import NamedTemporaryFile
+
+from enigma.core.keystream import Keystream
+
+EXTENSION = ".keystream"
+
+
+class KeystreamCache:
+    """Keystream tables on disk with least recently used eviction"""
+
+    def __init__(self, directory, max_size=1 << 26):
+        """
+        :param directory: {str} Directory to store tables in, created if missing
+        :param max_size: {int} Maximum total size of stored tables in bytes
+        """
+        if not isinstance(max_size, int) or max_size < 0:
+            raise ValueError("Keystream cache size must be a positive integer or 0!")
+
+        os.makedirs(directory, exist_ok=True)
+        self.__directory = directory
+        self.__max_size = max_size
+
+    @staticmethod
+    def key(config):
+        """Returns a hash of all settings that keystream tables depend on, which is
+        everything except the positions of the three stepping rotors, plug pairs
+        are only normalised when the Uhr is not connected
+        :param config: {dict} Settings in the EnigmaAPI.get_config format
+        """
+        canonical = {
+            key: value for key, value in config.items() if key != "rotor_positions"
+        }
+        canonical["static_positions"] = list(config["rotor_positions"][:-3])
+        # With the Uhr connected the order and orientation of plug pairs set the wiring
+        keys = ["reflector_pairs"]
+        if "uhr_position" not in config:
+            keys.append("plug_pairs")
+        for key in keys:
+            if canonical.get(key):
+                canonical[key] = sorted("".join(sorted(pair)) for pair in canonical[key])
+
+        data = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+        return sha256(data.encode("utf-8")).hexdigest()
+
+    def path(self, config):
+        """Returns path of the file tables for the config are stored in
+        :param config: {dict} Settings in the EnigmaAPI.get_config format
+        """
+        return os.path.join(self.__directory, self.key(config) + EXTENSION)
+
+    def get(self, config, enigma):
+        """Returns stored tables for the config or None if they are not stored
+        :param config: {dict} Settings in the EnigmaAPI.get_config format
+        :param enigma: {Enigma} Enigma with the settings of the config
+        :return: {Keystream or None}
+        """
+        path = self.path(config)
+        try:
+            keystream = Keystream.load(path, enigma)
+            os.utime(path)  # Marks the file as recently used
+        except (OSError, ValueError):
+            return None
+
+        logging.info("Loaded keystream tables from '%s'...", path)
+        return keystream
+
+    def put(self, config, keystream):
+        """Stores tables for the config and evicts least recently used tables
+        while the cache is over its size limit
+        :param config: {dict} Settings in the EnigmaAPI.get_config format
+        :param keystream: {Keystream} Tables compiled for the config
+        """
+        # Written under a temporary name so other processes never see a partial file
+        file = NamedTemporaryFile(dir=self.__directory, delete=False)
+        try:
+            with file:
+                keystream.save(file)
+            os.replace(file.name, self.path(config))
+        finally:
+            if os.path.exists(file.name):  # Left behind if writing or renaming failed
+                os.remove(file.name)
+        self.evict()
+
+    def size(self):
+        """Returns total size of stored tables in bytes"""
+        return sum(size for _, size, _ in self.__files())
+
+    def evict(self):
+        """Removes least recently used tables until the cache fits its size limit"""
+        files = sorted(self.__files())
+        total = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if total <= self.__max_size:
+                break
+            try:
+                os.remove(path)
+                logging.info("Evicted keystream tables '%s'...", path)
+            except OSError:  # Already evicted by another process
+                pass
+            total -= size
+
+    def __files(self):
+        """Returns last use time, size and path of all stored tables"""
+        files = []
+        for entry in os.scandir(self.__directory):
+            if entry.name.endswith(EXTENSION):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
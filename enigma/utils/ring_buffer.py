@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""Fixed-capacity ring buffer of unsigned integers backed by an array."""
+
+from array import array
+
+
+class RingBuffer:
+    """Keeps the last "capacity" appended integers, appending to a full buffer
+    overwrites the oldest value"""
+
+    def __init__(self, capacity, typecode="I"):
+        """
+        :param capacity: {int} Maximum number of stored values
+        :param typecode: {str} array typecode of stored values
+        """
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be at least 1!")
+
+        self.__capacity = capacity
+        self.__data = array(typecode)  # Grows up to capacity, then wraps around
+        self.__start = 0  # Index of the oldest value
+        self.__length = 0
+
+    def __len__(self):
+        return self.__length
+
+    def __iter__(self):
+        """Iterates from the oldest to the newest value"""
+        size = len(self.__data)
+        for i in range(self.__length):
+            yield self.__data[(self.__start + i) % size]
+
+    def capacity(self):
+        """Returns maximum number of stored values"""
+        return self.__capacity
+
+    def append(self, value):
+        """Appends a value, overwriting the oldest one if the buffer is full
+        :param value: {int}
+        """
+        size = len(self.__data)
+        if self.__length < size:
+            self.__data[(self.__start + self.__length) % size] = value
+            self.__length += 1
+        elif size < self.__capacity:  # Never wrapped yet, start is 0
+            self.__data.append(value)
+            self.__length += 1
+        else:
+            self.__data[self.__start] = value
+            self.__start = (self.__start + 1) % size
+
+    def extend(self, values):
+        """Appends all values in order
+        :param values: {iterable}
+        """
+        for value in values:
+            self.append(value)
+
+    def last(self):
+        """Returns the newest value or None if the buffer is empty"""
+        if not self.__length:
+            return None
+        return self.__data[(self.__start + self.__length - 1) % len(self.__data)]
+
+    def truncate(self, count):
+        """Removes select number of the newest values
+        :param count: {int}
+        """
+        self.__length = max(self.__length - count, 0)
+
+    def clear(self):
+        """Removes all values"""
+        self.__start = 0
+        self.__length = 0
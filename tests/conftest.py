@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-docstring
+import pytest
+
+from enigma.core import vectorized
+
+
+@pytest.fixture(params=(True, False), ids=("numpy", "python"))
+def numpy(request, monkeypatch):
+    """Runs the test with NumPy and again with the pure Python fallbacks,
+    returns the NumPy module or None"""
+    if request.param:
+        return pytest.importorskip("numpy")
+    monkeypatch.setattr(vectorized, "np", None)
+    return None
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-docstring
+import pickle
+from random import choices, sample
+from string import ascii_uppercase as alphabet
+
+import pytest
+
+from enigma.api.enigma_api import EnigmaAPI
+from enigma.analysis.bombe import menu, reflector_positions, register, run_bombe, wheel_orders
+from enigma.analysis.cribs import corpus_offsets, crib_offsets
+from enigma.analysis.hillclimb import PlugboardClimber, climb_plugboard
+from enigma.analysis.ioc import index_of_coincidence, ioc_search
+from enigma.analysis.ngrams import NgramTable, compile_tables, normalize
+from enigma.analysis.scrambler import Scrambler, plugboard_table
+from enigma.analysis.sweep import cycle_layout, sweep_positions
+from enigma.core.extensions import Uhr
+
+
+def test_cycle_layout():
+    successors = [1, 2, 0, 0, 3, 5, 4]
+    order, position, starts, lengths = cycle_layout(successors)
+
+    assert sorted(order) == [0, 1, 2, 5]
+    assert [position[state] >= 0 for state in range(7)] == [True] * 3 + [False] * 2 + [True, False]
+    for state in order:
+        cycle = order[starts[state]:starts[state] + lengths[state]]
+        assert successors[state] in cycle
+        assert order[position[state]] == state
+
+
+@pytest.mark.parametrize("model, reflector, rotors", (
+    ("Enigma M3", "UKW-B", ["VI", "II", "VIII"]),
+    ("Enigma M4", "UKW-c", ["Gamma", "I", "V", "VII"]),
+))
+def test_sweep_positions(model, reflector, rotors, numpy):
+    enigma_api = EnigmaAPI(model, reflector, rotors)
+    enigma_api.ring_settings([3, 17, 9, 22][:len(rotors)])
+    enigma_api.plug_pairs(["AQ", "BW", "CE", "DR", "FT"])
+    ciphertext = "".join(choices(alphabet, k=60))
+    if numpy is None:
+        with pytest.raises(ImportError):
+            sweep_positions(enigma_api.get_config(), ciphertext)
+        return
+
+    offsets, decrypts = sweep_positions(enigma_api.get_config(), ciphertext)
+    assert decrypts.shape == (26 ** len(rotors), len(ciphertext))
+    assert len({tuple(row) for row in offsets}) == len(offsets)
+
+    for row in sample(range(len(offsets)), 100):
+        enigma_api.positions([int(offset) + 1 for offset in offsets[row]])
+        assert "".join(alphabet[i] for i in decrypts[row]) == enigma_api.encrypt(ciphertext)
+
+    scored_offsets, scores = sweep_positions(
+        enigma_api.get_config(), ciphertext, score=lambda rows: (rows == 4).sum(axis=1)
+    )
+    assert (scored_offsets == offsets).all()
+    assert (scores == (decrypts == 4).sum(axis=1)).all()
+
+    with pytest.raises(ValueError):
+        sweep_positions(enigma_api.get_config(), "ABC1")
+
+
+def test_scrambler(numpy):
+    enigma_api = EnigmaAPI("Enigma M4", "UKW-b", ["Beta", "VI", "II", "VIII"])
+    enigma_api.ring_settings([4, 12, 20, 7])
+    enigma_api.positions(["Q", "E", "V", "Y"])
+    enigma_api.plug_pairs(["AB", "CD"])
+    message = "".join(choices(alphabet, k=300))
+    indices = [alphabet.index(letter) for letter in message]
+
+    scrambler = Scrambler(enigma_api.get_config(), len(message))
+    for _ in range(5):
+        pairs = ["".join(pair) for pair in zip(*[iter(sample(alphabet, 20))] * 2)]
+        enigma_api.plug_pairs(pairs)
+        enigma_api.load_checkpoint()
+        expected = enigma_api.encrypt(message)
+
+        output = scrambler.apply(indices, plugboard_table(pairs))
+        assert "".join(alphabet[index] for index in output) == expected
+
+    uhr = Uhr(pairs)
+    uhr.position(13)
+    enigma_api.uhr("connect")
+    enigma_api.plug_pairs(pairs)
+    enigma_api.uhr_position(13)
+    enigma_api.load_checkpoint()
+
+    output = scrambler.apply(indices, [uhr.route_index(i) for i in range(26)],
+                             [uhr.route_index(i, True) for i in range(26)])
+    assert "".join(alphabet[index] for index in output) == enigma_api.encrypt(message)
+
+    assert list(scrambler.permutation(0)) == [scrambler.apply([i])[0] for i in range(26)]
+    with pytest.raises(ValueError):
+        scrambler.apply(indices + [0])
+    with pytest.raises(ValueError):
+        scrambler.permutation(len(message))
+
+
+def test_bombe_reflector_position(monkeypatch):
+    enigma_api = EnigmaAPI("Enigma D", "UKW", ["II", "I", "III"])
+    enigma_api.positions(["C", "X", "O"])
+    enigma_api.reflector_position("K")
+    crib = "WETTERVORHERSAGEBISKAYA"
+    ciphertext = enigma_api.encrypt("XX" + crib + "XXXX")
+
+    # Only the right and one wrong reflector position, all 26 take too long
+    monkeypatch.setattr("enigma.analysis.bombe.reflector_positions", lambda _: [3, 11])
+    stops = list(run_bombe(crib, ciphertext, "Enigma D", 2,
+                           orders=[("UKW", ("II", "I", "III"))], workers=1))
+    assert {"positions": ["C", "X", "O"], "reflector_position": "K"}.items() <= stops[0].items()
+    assert all(stop["reflector_position"] in ("C", "K") for stop in stops)
+
+
+def test_bombe():
+    enigma_api = EnigmaAPI("Enigma I", "UKW-B", ["II", "IV", "V"])
+    enigma_api.positions(["B", "L", "A"])
+    pairs = ["AV", "BS", "CG", "DL", "FU", "HZ", "IN", "KM", "OW", "RX"]
+    enigma_api.plug_pairs(pairs)
+    crib = "WETTERVORHERSAGEBISKAYA"
+    ciphertext = enigma_api.encrypt("XX" + crib + "XXXX")
+
+    edges = menu(crib, ciphertext, 2)
+    assert len(edges) == len(crib) and edges[0][2] == 2
+    assert register(edges, 26) in range(26)
+
+    stops = list(run_bombe(crib, ciphertext, "Enigma I", 2,
+                           orders=[("UKW-B", ("II", "IV", "V"))], workers=1))
+    found = [stop for stop in stops if stop["positions"] == ["02", "12", "01"]]
+    assert len(found) == 1 and found[0]["rotors"] == ["II", "IV", "V"]
+    assert len(found[0]["plug_pairs"]) > 5 and set(found[0]["plug_pairs"]) <= set(pairs)
+    for stop in stops:
+        enigma_api.plug_pairs(stop["plug_pairs"])  # Accepted by the plugboard
+
+    assert len(wheel_orders("Enigma I")) == 3 * 60
+    assert reflector_positions(enigma_api) == [None]
+    assert reflector_positions(EnigmaAPI("Enigma D", "UKW")) == list(range(1, 27))
+    assert reflector_positions(EnigmaAPI("Enigma D", "UKW-D")) == [None]
+    assert len(wheel_orders("Enigma M4", ["UKW-b"])) == 2 * 336
+    with pytest.raises(ValueError):
+        menu(crib, ciphertext, 20)
+    with pytest.raises(ValueError):
+        menu("A", "A")
+
+
+def test_crib_offsets(numpy):
+    def expected(crib, message):
+        return [offset for offset in range(len(message) - len(crib) + 1)
+                if all(a != b for a, b in zip(crib, message[offset:]))]
+
+    messages = ["".join(choices("ABCDE", k=length)) for length in (0, 3, 40, 7, 25)]
+    cribs = ["ABC", "EDCBAE", "A" * 8]
+    results = corpus_offsets(cribs, messages)
+    for crib in cribs:
+        assert list(crib_offsets(crib, messages[2])) == expected(crib, messages[2])
+        indices, offsets = results[crib]
+        assert list(zip(indices, offsets)) == [
+            (index, offset) for index, message in enumerate(messages)
+            for offset in expected(crib, message)
+        ]
+
+    assert list(crib_offsets("AB", "AABBXB")) == [3]
+    assert list(crib_offsets("ÄB", "ÄxBBXB€")) == [3, 5]
+    assert list(crib_offsets("ABC", "AB")) == []
+    with pytest.raises(ValueError):
+        crib_offsets("", "ABC")
+
+
+GERMAN = (
+    "DASOBERKOMMANDODERWEHRMACHTGIBTBEKANNTDASSDIEDEUTSCHENTRUPPENAMHEUTIGENTAGE"
+    "INDENFRUEHENMORGENSTUNDENDIEGRENZEUEBERSCHRITTENHABENUNDNACHSCHWERENKAEMPFEN"
+    "DIEFEINDLICHENSTELLUNGENAMFLUSSEEINGENOMMENWORDENSINDDIEVERLUSTESINDGERING"
+)
+
+
+def test_ioc_search():
+    np = pytest.importorskip("numpy")
+    rows = np.array([[0, 0, 1, 2], [3, 3, 3, 3]], dtype=np.uint8)
+    assert list(index_of_coincidence(rows, 26)) == [2 / 12, 1.0]
+
+    enigma_api = EnigmaAPI("Enigma I", "UKW-B", ["II", "IV", "V"])
+    enigma_api.positions(["Q", "E", "V"])
+    ciphertext = enigma_api.encrypt(GERMAN)
+
+    reports = []
+    candidates = ioc_search(
+        ciphertext, "Enigma I", top=3, workers=1,
+        orders=[("UKW-B", ("I", "II", "III")), ("UKW-B", ("II", "IV", "V"))],
+        progress=lambda *args: reports.append(args)
+    )
+    assert len(candidates) == 6
+    assert [report[:2] for report in reports] == [(1, 2), (2, 2)]
+    assert all(report[2] > 0 for report in reports)
+    assert candidates[0]["rotors"] == ["II", "IV", "V"]
+    assert candidates[0]["positions"] == ["17", "05", "22"]
+    assert [candidate["score"] for candidate in candidates] == \
+        sorted((candidate["score"] for candidate in candidates), reverse=True)
+
+    # Rotatable reflectors are searched in every position
+    enigma_api = EnigmaAPI("Enigma D", "UKW", ["II", "I", "III"])
+    enigma_api.positions(["C", "X", "H"])
+    enigma_api.reflector_position("K")
+    candidates = ioc_search(enigma_api.encrypt(GERMAN), "Enigma D", top=3, workers=1,
+                            orders=[("UKW", ("II", "I", "III"))])
+    assert candidates[0]["positions"] == ["C", "X", "H"]
+    assert candidates[0]["reflector_position"] == "K"
+
+    with pytest.raises(ValueError):
+        ioc_search(ciphertext, "Enigma I", top=0)
+
+
+def test_ngram_table(numpy, tmp_path):
+    ngrams = NgramTable.from_text("ab-ab b", 2)
+    assert ngrams.n() == 2 and len(ngrams.table()) == 26 ** 2
+    assert ngrams.code([0, 1]) == 1 and ngrams.code([1, 0]) == 26
+    assert ngrams.table()[1] > ngrams.table()[26] > ngrams.table()[0]
+    assert ngrams.score([0, 1, 0]) == pytest.approx(ngrams.table()[1] + ngrams.table()[26])
+    assert normalize("Grüße aus Köln") == "GRUESSE AUS KOELN"
+    assert list(NgramTable.indices("AB«É»C")) == [0, 1, 2]
+    if numpy:  # Letters outside of ASCII must not force the per-letter path
+        assert isinstance(NgramTable.indices("AB«É»C"), numpy.ndarray)
+
+    tables = compile_tables(GERMAN, (1, 3))
+    path = str(tmp_path / "trigrams.ngrams")
+    with open(path, "wb") as file:
+        tables[3].save(file)
+    loaded = NgramTable.load(path)
+    assert loaded.n() == 3 and loaded.charset() == alphabet
+    assert list(loaded.table()) == list(tables[3].table())
+    assert list(pickle.loads(pickle.dumps(loaded)).table()) == list(loaded.table())
+
+    indices = [alphabet.index(letter) for letter in GERMAN]
+    assert loaded.score(indices) == pytest.approx(tables[3].score(indices))
+    assert tables[1].score(indices) > tables[1].score([alphabet.index("Q")] * len(indices))
+    if numpy:
+        rows = numpy.array([indices, indices[::-1]], dtype=numpy.uint8)
+        assert list(loaded.score_rows(rows)) == pytest.approx(
+            [loaded.score(indices), loaded.score(indices[::-1])]
+        )
+        assert loaded.score(rows[0]) == pytest.approx(loaded.score(indices))
+
+    with open(path, "r+b") as file:
+        file.write(b"XXXX")
+    with pytest.raises(ValueError):
+        NgramTable.load(path)
+    with open(path, "wb") as file:  # Valid layout rejected by the table itself
+        file.write(b"ENG1" + bytes([0]) + (26).to_bytes(2, "little") + alphabet.encode() + bytes(7))
+    with pytest.raises(ValueError):
+        NgramTable.load(path)
+    with pytest.raises(ValueError):
+        NgramTable(2, [0.0] * 26)
+
+
+def test_climb_plugboard():
+    pairs = ["AV", "BS", "CG", "DL", "FU", "HZ", "IN", "KM", "OW", "RX"]
+    enigma_api = EnigmaAPI("Enigma I", "UKW-B", ["II", "IV", "V"])
+    enigma_api.positions(["Q", "E", "V"])
+    enigma_api.plug_pairs(pairs)
+    config = enigma_api.get_config()
+    ciphertext = enigma_api.encrypt(GERMAN)
+    ngrams = NgramTable.from_text(GERMAN, 3)
+
+    found, score = climb_plugboard(config, ciphertext, ngrams, workers=1, seed=1)
+    assert found == pairs
+    enigma_api.plug_pairs(found)  # Accepted by the plugboard
+
+    climber = PlugboardClimber(config, ciphertext, ngrams)
+    climbed, climbed_score = climber.climb(["AB", "CD"], max_pairs=4)
+    assert len(climbed) <= 4
+    enigma_api.load_from_config(dict(config, plug_pairs=climbed))
+    decrypt = [alphabet.index(letter) for letter in enigma_api.encrypt(ciphertext)]
+    assert climbed_score == pytest.approx(ngrams.score(decrypt))
+    assert score == pytest.approx(ngrams.score([alphabet.index(letter) for letter in GERMAN]))
+
+    with pytest.raises(ValueError):
+        climb_plugboard(config, ciphertext, ngrams, max_pairs=14)
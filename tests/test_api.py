@@ -1,14 +1,20 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 # pylint: disable=missing-docstring
+import json
 import subprocess
+from argparse import Namespace
 from random import choice, choices, randint, sample, shuffle
 from string import ascii_uppercase as alphabet
 
 import pytest
 
+from enigma.api.batch import run_batch
 from enigma.api.enigma_api import EnigmaAPI
+from enigma.core import keystream
 from enigma.core.components import HISTORICAL, Rotor
+from enigma.interface.cli import read_chunks, stream
+from enigma.utils.keystream_cache import KeystreamCache
 
 TRASH_DATA = ("iweahbrnawjhb", EnigmaAPI, 12341123, -1332, "heaaafs", "", Rotor,
               "Engima", ["fweafawe", "4324", 43, None], "č",
@@ -215,6 +221,240 @@ def test_uhr():
     assert with_uhr == without_uhr
 
 
+def test_substitution_cache():
+    cached = EnigmaAPI("Enigma M3", "UKW-B", ["I", "II", "III"], cache_size=500)
+    plain = EnigmaAPI("Enigma M3", "UKW-B", ["I", "II", "III"])
+    message = "".join(choices(alphabet, k=2000))
+
+    for api in cached, plain:
+        api.plug_pairs(["AB", "CD"])
+        api.set_checkpoint()
+    assert cached.encrypt(message) == plain.encrypt(message)
+
+    # Repeated positions must be served from the cache without routing any signal
+    routed = []
+    route = cached._enigma._route
+    cached._enigma._route = lambda index: routed.append(index) or route(index)
+    cached.load_checkpoint()
+    cached.encrypt(message[:100])
+    assert len(routed) == 100 * len(alphabet)
+    cached.load_checkpoint()
+    cached.encrypt(message[:100])
+    assert len(routed) == 100 * len(alphabet), "Substitution cache was not used!"
+    del cached._enigma._route
+
+    # Every change of settings must discard the memoized substitutions
+    changes = (
+        ("rotors", ["V", "II", "IV"]),
+        ("ring_settings", [3, 14, 25]),
+        ("plug_pairs", ["QW", "ER", "TZ"]),
+        ("reflector", "UKW-C"),
+        ("reflector", "UKW-D"),
+        ("reflector_pairs", ["HK", "GL", "NQ", "SV", "UX", "TZ", "RW", "AD", "BF", "CO", "EP", "IM"]),
+    )
+    for setter, value in changes:
+        for api in cached, plain:
+            getattr(api, setter)(value)
+            api.load_checkpoint()
+        assert cached.encrypt(message) == plain.encrypt(message), "Stale substitution after %s!" % setter
+
+    for api in cached, plain:
+        api.reflector("UKW-B")
+        api.uhr("connect")
+        api.plug_pairs(generate_pairs(10))
+    plain.plug_pairs(cached.plug_pairs())
+    for position in 5, 17:
+        for api in cached, plain:
+            api.uhr_position(position)
+            api.load_checkpoint()
+        assert cached.encrypt(message) == plain.encrypt(message)
+
+
+@pytest.mark.parametrize("model, reflector, rotors", (
+    ("Enigma M4", "UKW-b", ["Beta", "VI", "VIII", "II"]),
+    ("Enigma G (G-312)", "UKW", ["III", "I", "II"]),
+    ("Tirpitz", "UKW-D", ["VII", "I", "IV"]),
+    ("Enigma Z", "UKW", ["I", "II", "III"]),
+))
+def test_precompiled(model, reflector, rotors):
+    precompiled = EnigmaAPI(model, reflector, rotors, position_buffer=100)
+    plain = EnigmaAPI(model, reflector, rotors, position_buffer=100)
+    precompiled.precompiled(True)
+    message = "".join(choices(plain.charset(), k=3000))
+
+    for _ in range(3):
+        ring_settings = [randint(1, len(plain.charset())) for _ in range(plain.rotor_n())]
+        for api in precompiled, plain:
+            api.ring_settings(ring_settings)
+            api.positions([3] * api.rotor_n())
+
+        assert precompiled.encrypt(message) == plain.encrypt(message)
+        assert precompiled.positions() == plain.positions()
+
+        for api in precompiled, plain:
+            api.revert_by(37)
+        assert precompiled.positions() == plain.positions()
+
+
+def test_keystream_cache(tmp_path, monkeypatch):
+    table_size = 5 + 26 ** 4 + 26 ** 3 * 4  # Header, substitutions and successors
+    cache = KeystreamCache(str(tmp_path), max_size=2 * table_size)
+    message = "".join(choices(alphabet, k=1000))
+
+    def precompiled(pairs, positions):
+        enigma_api = EnigmaAPI("Enigma M4", "UKW-b", ["Beta", "I", "II", "III"])
+        enigma_api.plug_pairs(pairs)
+        enigma_api.positions(positions)
+        enigma_api.keystream_cache(cache)
+        enigma_api.precompiled(True)
+        return enigma_api
+
+    expected = precompiled(["AB", "CD"], [1, 5, 9, 13]).encrypt(message)
+    assert cache.size() == table_size
+
+    # Same settings in another order and other stepping positions load the stored tables
+    def fail(*_):
+        raise AssertionError("Keystream tables were compiled again!")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(keystream.Keystream, "__init__", fail)
+        enigma_api = precompiled(["DC", "BA"], [1, 2, 3, 4])
+        enigma_api.positions([1, 5, 9, 13])
+        assert enigma_api.encrypt(message) == expected
+
+        with pytest.raises(AssertionError):
+            precompiled(["DC", "BA"], [2, 5, 9, 13]).encrypt(message)
+
+    precompiled(["DC", "BA"], [2, 5, 9, 13]).encrypt(message)
+    precompiled(["EF"], [2, 5, 9, 13]).encrypt(message)
+    assert cache.size() == 2 * table_size
+
+    evicted = precompiled(["AB", "CD"], [1, 1, 1, 1])
+    assert cache.get(evicted.get_config(), evicted.enigma()) is None
+
+    # Failed writes must not leave temporary files behind
+    files = sorted(tmp_path.iterdir())
+
+    def broken(*_):
+        raise OSError("No space left on device")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(keystream.Keystream, "save", broken)
+        with pytest.raises(OSError):
+            precompiled(["GH"], [1, 1, 1, 1]).encrypt(message)
+    assert sorted(tmp_path.iterdir()) == files
+
+
+def test_keystream_cache_uhr(tmp_path):
+    cache = KeystreamCache(str(tmp_path))
+    message = "".join(choices(alphabet, k=100))
+    pairs = generate_pairs(10)
+
+    def encrypt(pairs, precompiled):
+        enigma_api = EnigmaAPI("Enigma I", "UKW-B", ["I", "II", "III"])
+        enigma_api.uhr("connect")
+        enigma_api.plug_pairs(pairs)
+        enigma_api.uhr_position(13)
+        if precompiled:
+            enigma_api.keystream_cache(cache)
+            enigma_api.precompiled(True)
+        return enigma_api.get_config(), enigma_api.encrypt(message)
+
+    # Order and orientation of the pairs set the Uhr wiring, so they must not share tables
+    keys = set()
+    for wiring in pairs, pairs[::-1], [pair[::-1] for pair in pairs]:
+        config, expected = encrypt(wiring, False)
+        keys.add(KeystreamCache.key(config))
+        assert encrypt(wiring, True)[1] == expected
+
+    assert len(keys) == 3
+
+
+@pytest.mark.parametrize("model", HISTORICAL.keys())
+def test_encrypt_array(model, numpy):
+    labels = EnigmaAPI.model_labels(model)
+    for reflector in labels["reflectors"]:
+        rotor_labels = [label for label in labels["rotors"] if label not in ("Beta", "Gamma")]
+        rotors = sample(rotor_labels, 3)
+        if HISTORICAL[model]["rotor_n"] == 4 and reflector != "UKW-D":
+            rotors = ["Beta"] + rotors
+        size = len(HISTORICAL[model]["charset"])
+        positions = [randint(1, size - 1) for _ in rotors]
+        ring_settings = [randint(1, size) for _ in rotors]
+        pairs, uhr_position = generate_pairs(10), randint(0, 39)
+
+        bulk, plain = (EnigmaAPI(model, reflector, rotors, position_buffer=50) for _ in range(2))
+        for api in bulk, plain:
+            api.positions(positions)
+            api.ring_settings(ring_settings)
+            if api.data()["plugboard"]:
+                api.uhr("connect")
+                api.plug_pairs(pairs)
+                api.uhr_position(uhr_position)
+
+        message = "".join(choices(bulk.charset(), k=2000))
+        indices = [bulk.charset().index(letter) for letter in message]
+        if numpy:
+            indices = numpy.array(indices, dtype=numpy.uint8)
+
+        result = "".join(bulk.charset()[index] for index in bulk.encrypt_array(indices))
+        assert result == plain.encrypt(message)
+        assert bulk.positions() == plain.positions()
+
+        for api in bulk, plain:
+            api.revert_by(20)
+        assert bulk.positions() == plain.positions()
+
+
+def test_parallel_encrypt():
+    parallel = EnigmaAPI("Enigma M4", "UKW-b", ["Gamma", "VI", "VIII", "VII"], position_buffer=300)
+    serial = EnigmaAPI("Enigma M4", "UKW-b", ["Gamma", "VI", "VIII", "VII"], position_buffer=300)
+    pairs = generate_pairs(10)
+    for api in parallel, serial:
+        api.ring_settings([2, 9, 17, 24])
+        api.positions([4, 25, 5, 26])
+        api.uhr("connect")
+        api.plug_pairs(pairs)
+        api.uhr_position(27)
+
+    message = "".join(choices(alphabet, k=5000))
+    assert parallel.encrypt(message, parallel=3) == serial.encrypt(message)
+    assert parallel.positions() == serial.positions()
+
+    for api in parallel, serial:
+        api.revert_by(250)
+    assert parallel.positions() == serial.positions()
+
+    with pytest.raises(ValueError):
+        parallel.encrypt("ABCDč", parallel=2)
+
+
+@pytest.mark.parametrize("position_buffer", (30, 0))
+def test_position_buffer_overflow(position_buffer):
+    enigma_api = EnigmaAPI("Enigma M4", "UKW-b", ["Beta", "I", "II", "III"],
+                           position_buffer=position_buffer)
+    enigma_api.positions([7, 17, 25, 26])
+
+    positions = [enigma_api.positions()]
+    for letter in "".join(choices(alphabet, k=100)):
+        enigma_api.encrypt(letter)
+        positions.append(enigma_api.positions())
+    assert enigma_api.buffer_full() == bool(position_buffer)
+
+    # Reverting past the buffer recomputes positions from the checkpoint
+    for revert_by in 1, 10, 19, 50:
+        enigma_api.revert_by(revert_by)
+        del positions[-revert_by:]
+        assert enigma_api.positions() == positions[-1]
+
+    enigma_api.encrypt(enigma_api.encrypt("ABCDEFGHIJKLMNOPQRSTUVWXYZ" * 10))
+    enigma_api.revert_by(520)
+    assert enigma_api.positions() == positions[-1]
+
+    enigma_api.revert_by(100)
+    assert enigma_api.positions() == ("G", "Q", "Y", "Z")
+
+
 def test_generate_rotor_callback():
     enigma_api = EnigmaAPI("Enigma I")
 
@@ -236,6 +476,99 @@ def test_cli():
                                             "DAUSGANGBAERWALDEXENDEDREIKMOSTWAERTSNEUSTADT"
 
 
+def test_encrypt_stream():
+    streamed = EnigmaAPI("Enigma I", "UKW-A", ["II", "I", "III"])
+    joined = EnigmaAPI("Enigma I", "UKW-A", ["II", "I", "III"])
+    chunks = ["".join(choices(alphabet, k=randint(0, 100))) for _ in range(30)]
+
+    assert "".join(streamed.encrypt_stream(iter(chunks))) == joined.encrypt("".join(chunks))
+    assert streamed.positions() == joined.positions()
+
+
+def test_cli_stream(tmp_path):
+    source, target = tmp_path / "message.txt", tmp_path / "encrypted.txt"
+    source.write_text("Feind liegt\nbei Maxim 3, Anfang!\n" * 3000)
+
+    enigma_api = EnigmaAPI("Enigma I", "UKW-A", ["II", "I", "III"])
+    stream(enigma_api, Namespace(input=[str(source)], output=[str(target)]))
+
+    with open(str(source)) as text:
+        filtered = "".join(read_chunks(text, alphabet, chunk_size=7))
+    assert filtered == "FEINDLIEGTBEIMAXIMANFANG" * 3000
+
+    enigma_api.load_checkpoint()
+    assert target.read_text() == enigma_api.encrypt(filtered)
+
+    # Missing input and unwritable output files
+    missing = tmp_path / "missing.txt"
+    for input_path, output_path in ([str(missing)], None), ([str(source)], [str(tmp_path)]):
+        with pytest.raises(SystemExit):
+            stream(enigma_api, Namespace(input=input_path, output=output_path))
+
+
+@pytest.mark.parametrize("dst", (None, "message.txt", "encrypted.txt"))
+def test_encrypt_file(tmp_path, numpy, dst):
+    source, target = tmp_path / "message.txt", tmp_path / "encrypted.txt"
+    text = "FEIND LIEGT\nBEI MAXIM 3, ANFANG!\n" * 3000
+    source.write_text(text)
+
+    enigma_api = EnigmaAPI("Enigma I", "UKW-A", ["II", "I", "III"])
+    length = enigma_api.encrypt_file(
+        str(source), dst and str(tmp_path / dst), block_size=1000
+    )
+    final_positions = enigma_api.positions()
+    assert length == len("FEINDLIEGTBEIMAXIMANFANG") * 3000
+
+    enigma_api.load_checkpoint()
+    letters = iter(enigma_api.encrypt("FEINDLIEGTBEIMAXIMANFANG" * 3000))
+    expected = "".join(next(letters) if char in alphabet else char for char in text)
+
+    assert (target if dst == target.name else source).read_text() == expected
+    assert enigma_api.positions() == final_positions
+
+
+@pytest.mark.parametrize("workers", (1, 2))
+def test_batch(workers):
+    configs = []
+    for uhr in (True, False, True):
+        api = EnigmaAPI("Enigma M4", "UKW-b", ["Gamma", "VI", "VIII", "VII"])
+        api.ring_settings([randint(1, 26) for _ in range(4)])
+        api.positions([randint(1, 26) for _ in range(4)])
+        if uhr:
+            api.uhr("connect")
+            api.uhr_position(randint(0, 39))
+        api.plug_pairs(generate_pairs(10))
+        configs.append(api.get_config())
+
+    api = EnigmaAPI("Enigma I", "UKW-D", ["II", "IV", "V"])
+    api.reflector_pairs(["AB", "CD", "EF", "GH", "IK", "LM", "NO", "PQ", "RS", "TU", "VW", "XZ"])
+    configs.append(api.get_config())
+    api = EnigmaAPI("Enigma D", "UKW", ["I", "II", "III"])
+    api.reflector_position(randint(1, 26))
+    configs.append(api.get_config())
+
+    jobs = [json.dumps(dict(config, message="".join(choices(alphabet, k=300))))
+            for config in configs]
+    invalid = ['{"model": "Enigma I"', json.dumps(dict(configs[0], message="ABCDč")),
+               json.dumps({"model": "Enigma I"}),
+               json.dumps(dict(configs[3], reflector=7, message="AB"))]
+    lines = jobs + [""] + invalid + jobs[::-1]
+
+    results = list(run_batch(lines, workers))
+    assert [result["job"] for result in results] == list(range(1, len(jobs) * 2 + 5))
+
+    for result, line in zip(results, jobs + invalid + jobs[::-1]):
+        job = json.loads(line) if line in jobs else None
+        if job is None:
+            assert "error" in result and "message" not in result
+            continue
+
+        enigma_api = EnigmaAPI(job["model"])
+        enigma_api.load_from_config(job)
+        assert result["message"] == enigma_api.encrypt(job["message"])
+        assert result["positions"] == list(enigma_api.positions())
+
+
 def test_generate_component():
     for _ in range(1000):
         model = choice(list(HISTORICAL.keys()))
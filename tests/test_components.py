@@ -1,12 +1,13 @@
 #!/usr/bin/env python3
 # pylint: disable=no-name-in-module,missing-docstring,line-too-long
 
+from random import choice, randint, sample
 from string import ascii_uppercase as alphabet
 
 import pytest
 
 from enigma.api.enigma_api import EnigmaAPI
-from enigma.core import contains
+from enigma.core import contains, shared, vectorized
 from enigma.core.components import UKWD, Plugboard, Uhr
 
 
@@ -34,6 +35,18 @@ def test_ukwd():
         assert contains(pairs, pair)
 
 
+def test_ukwd_rewiring():
+    ukwd = UKWD(["AB", "CD", "EF", "GH", "IK", "LM", "NO", "PQ", "RS", "TU", "VW", "XZ"])
+    before = [ukwd.reflect(letter) for letter in alphabet]
+
+    ukwd.reflector_pairs(["HK", "GL", "NQ", "SV", "UX", "TZ", "RW", "AD", "BF", "CO", "EP", "IM"])
+    after = [ukwd.reflect(letter) for letter in alphabet]
+
+    assert before != after, "Routing tables were not rebuilt after rewiring!"
+    for letter in alphabet:
+        assert ukwd.reflect(ukwd.reflect(letter)) == letter
+
+
 def test_uhr_addon():
     enigma = EnigmaAPI.generate_enigma("Enigma M4", "UKW-b", ["Beta", "I", "II", "III"])
     enigma.uhr("connect")
@@ -79,6 +92,21 @@ def test_uhr_reciprocity():
             assert uhr.route(uhr.route(ltr), True) == ltr
 
 
+def test_uhr_tables():
+    uhr = Uhr(["AB", "CD", "EF", "GH", "IJ", "KL", "MN", "OP", "QR", "ST"])
+    uhr.rotate(45)
+    rotated = [uhr.route(letter) for letter in alphabet]
+    uhr.position(5)
+    assert rotated == [uhr.route(letter) for letter in alphabet]
+
+    for index, letter in enumerate(alphabet):
+        assert alphabet[uhr.route_index(index, True)] == uhr.route(letter, True)
+
+    # Changing pairs must recompile the tables for the current position
+    uhr.pairs(["AZ", "BY", "CX", "DW", "EV", "FU", "GT", "HS", "IR", "JQ"])
+    assert rotated != [uhr.route(letter) for letter in alphabet]
+
+
 def test_routing():
     """
     Tests if the forward routing is being routed correctly in the opposite direction (taking the
@@ -144,6 +172,50 @@ def test_turnover():
         enigma.rotate()
 
 
+@pytest.mark.parametrize("model, reflector, rotors", (
+    ("Enigma M3", "UKW-B", ["I", "II", "III"]),
+    ("Enigma M4", "UKW-b", ["Beta", "VI", "VII", "VIII"]),
+    ("Enigma G (A865)", "UKW", ["II", "III", "I"]),
+    ("Tirpitz", "UKW", ["V", "VI", "VII"]),
+))
+def test_compiled_stepping(model, reflector, rotors):
+    reference, enigma, compiled = (
+        EnigmaAPI.generate_enigma(model, reflector, rotors) for _ in range(3)
+    )
+    compiled.compiled_stepping(True)
+    assert compiled.compiled_stepping() and not enigma.compiled_stepping()
+
+    for _ in range(3):
+        positions = [randint(1, 26) for _ in range(enigma.rotor_n())]
+        for machine in (reference, enigma, compiled):
+            machine.positions(positions)
+
+        for _ in range(1500):
+            left, middle, right = reference._rotors[-3:]
+            if right.position() in right._turnover:  # Double-step by notch letters
+                middle.rotate()
+            if middle.position() in middle._turnover:
+                middle.rotate()
+                left.rotate()
+            right.rotate()
+
+            enigma._step()
+            compiled._step()
+            assert enigma.positions() == compiled.positions() == reference.positions()
+
+    # The table follows wheel order changes
+    new_rotors = [EnigmaAPI.generate_component(model, "rotors", label) for label in rotors[::-1]]
+    compiled.rotors(new_rotors)
+    enigma.rotors([EnigmaAPI.generate_component(model, "rotors", label) for label in rotors[::-1]])
+    for _ in range(700):
+        enigma._step()
+        compiled._step()
+        assert enigma.positions() == compiled.positions()
+
+    compiled.compiled_stepping(False)
+    assert not compiled.compiled_stepping()
+
+
 def test_enigma():
     enigma = EnigmaAPI.generate_enigma("Enigma M3", "UKW-B", ["I", "II", "III"])
 
@@ -154,6 +226,165 @@ def test_enigma():
     assert result == "BDZGOW"
 
 
+def test_press_index():
+    by_key = EnigmaAPI.generate_enigma("Enigma M4", "UKW-b", ["Beta", "I", "II", "III"])
+    by_index = EnigmaAPI.generate_enigma("Enigma M4", "UKW-b", ["Beta", "I", "II", "III"])
+    for enigma in by_key, by_index:
+        enigma.uhr("connect")
+        enigma.uhr_position(7)
+        enigma.plug_pairs(["AB", "CD", "EF", "GH", "IJ", "KL", "MN", "OP", "QR", "ST"])
+
+    message = "THEQUICKBROWNFOXJUMPSOVERTHELAZYDOG" * 20
+    expected = "".join(by_key.press_key(letter) for letter in message)
+    result = by_index.encrypt_indices([alphabet.index(letter) for letter in message])
+
+    assert "".join(alphabet[index] for index in result) == expected
+    assert by_key.positions() == by_index.positions()
+
+    with pytest.raises(ValueError):
+        by_index.press_index(26)
+
+
+def test_offsets():
+    enigma = EnigmaAPI.generate_enigma("Enigma M4", "UKW-b", ["Beta", "I", "II", "III"])
+    enigma.positions(["B", "C", "D", "Z"])
+    assert enigma.offsets() == (1, 2, 3, 25)
+
+    enigma.offsets([0, 4, 25, 7])
+    assert enigma.positions() == ("A", "E", "Z", "H")
+
+    # Key presses step first and then route trough the substitution
+    enigma.advance(1)
+    substitution = enigma.substitution()
+    for index, letter in enumerate(alphabet):
+        enigma.offsets([0, 4, 25, 7])
+        assert enigma.press_key(letter) == alphabet[substitution[index]]
+
+    for offsets in [0, 0, 0], [0, 0, 0, 26]:
+        with pytest.raises(ValueError):
+            enigma.offsets(offsets)
+
+
+@pytest.mark.parametrize("model, static_labels, rotor_labels", (
+    ("Enigma M4", ["Beta", "Gamma"], ["I", "II", "V", "VI", "VII", "VIII"]),
+    ("Enigma D", [], ["I", "II", "III"]),
+))
+def test_encrypt_batch(model, static_labels, rotor_labels):
+    pytest.importorskip("numpy")
+    enigmas = []
+    for _ in range(40):
+        labels = sample(rotor_labels, 3)
+        if static_labels:
+            labels.insert(0, choice(static_labels))
+            enigma = EnigmaAPI.generate_enigma(model, choice(["UKW-b", "UKW-c"]), labels)
+            enigma.plug_pairs(["".join(pair) for pair in zip(*[iter(sample(alphabet, 20))] * 2)])
+        else:
+            enigma = EnigmaAPI.generate_enigma(model, "UKW", labels)
+            enigma.reflector_position(randint(1, 26))
+
+        enigma.positions([randint(1, 26) for _ in labels])
+        enigma.ring_settings([randint(1, 26) for _ in labels])
+        enigmas.append(enigma)
+
+    message = "".join(choice(alphabet) for _ in range(700))
+    result = vectorized.encrypt_batch(enigmas, [alphabet.index(letter) for letter in message])
+    assert result.shape == (len(enigmas), len(message))
+
+    for enigma, row in zip(enigmas, result):
+        positions = enigma.positions()
+        expected = "".join(enigma.press_key(letter) for letter in message)
+        assert "".join(alphabet[index] for index in row) == expected
+        enigma.positions(positions)
+
+    texts = [[randint(0, 25) for _ in range(50)] for _ in enigmas]
+    result = vectorized.encrypt_batch(enigmas, texts)
+    for enigma, text, row in zip(enigmas, texts, result):
+        assert list(row) == enigma.encrypt_indices(text)
+
+    with pytest.raises(ValueError):
+        vectorized.encrypt_batch(enigmas, [[0]])
+    with pytest.raises(ValueError):
+        vectorized.encrypt_batch(enigmas + [EnigmaAPI.generate_enigma("Enigma I")], [0])
+
+
+def test_shared_tables(monkeypatch):
+    tables = shared.SharedTables(models=["Enigma M4", "Enigma I"])
+    attached = shared.SharedTables(tables.name())
+
+    monkeypatch.setattr(shared, "_attached", attached)
+    by_shared = EnigmaAPI.generate_enigma("Enigma M4", "UKW-c", ["Gamma", "VIII", "I", "V"])
+    assert isinstance(by_shared._rotors[1]._forward_table, memoryview)
+    assert isinstance(by_shared._stator._backward_table, memoryview)
+    assert isinstance(EnigmaAPI.generate_enigma("Enigma I", "UKW-D")._reflector._forward_table, list)
+    assert attached.tables("Enigma M3", "rotors", "I") is None
+    monkeypatch.setattr(shared, "_attached", None)
+
+    by_compiled = EnigmaAPI.generate_enigma("Enigma M4", "UKW-c", ["Gamma", "VIII", "I", "V"])
+    message = "THEQUICKBROWNFOXJUMPSOVERTHELAZYDOG" * 30
+    assert "".join(map(by_shared.press_key, message)) == "".join(map(by_compiled.press_key, message))
+
+    del by_shared  # Views must be released before detaching
+    attached.close()
+    tables.close()
+
+
+def reference_route(enigma, index):
+    index = enigma._stator.forward_index(enigma._plugboard_route(index))
+    for rotor in reversed(enigma._rotors):
+        index = rotor.forward_index(index)
+    index = enigma._reflector.reflect_index(index)
+    for rotor in enigma._rotors:
+        index = rotor.backward_index(index)
+    return enigma._plugboard_route(enigma._stator.backward_index(index), True)
+
+
+@pytest.mark.parametrize("model, reflector, rotors", (
+    ("Enigma M4", "UKW-b", ["Beta", "II", "IV", "VI"]),
+    ("Enigma D", "UKW", ["I", "II", "III"]),
+))
+def test_slow_rotor_composite(model, reflector, rotors):
+    enigma = EnigmaAPI.generate_enigma(model, reflector, rotors)
+    for _ in range(300):
+        action = randint(0, 5)
+        if action == 0:
+            enigma.rotate_rotor(randint(0, len(rotors) - 1), randint(1, 25))
+        elif action == 1 and enigma.reflector_rotatable():
+            enigma.rotate_reflector(randint(1, 25))
+        elif action == 2:
+            enigma.ring_settings([randint(1, 26) for _ in rotors])
+        else:
+            enigma._step()
+
+        assert [enigma._route(i) for i in range(26)] == \
+            [reference_route(enigma, i) for i in range(26)]
+
+
+@pytest.mark.parametrize("model, reflector, rotors", (
+    ("Enigma M3", "UKW-B", ["I", "II", "III"]),
+    ("Enigma M4", "UKW-c", ["Gamma", "VII", "VI", "VIII"]),
+    ("Enigma G (A865)", "UKW", ["II", "III", "I"]),
+    ("Tirpitz", "UKW", ["V", "VI", "VII"]),
+))
+def test_state_after(model, reflector, rotors):
+    enigma = EnigmaAPI.generate_enigma(model, reflector, rotors)
+    enigma.positions([5] * enigma.rotor_n())
+    expected = enigma.state_after(2000)
+    offsets = [enigma.state_after(presses) for presses in range(700)]
+
+    for presses in range(2000):
+        if presses < 700:
+            assert enigma.positions() == offsets[presses]
+        enigma.press_index(0)
+    assert enigma.positions() == expected
+
+    enigma.positions([5] * enigma.rotor_n())
+    enigma.advance(2000)
+    assert enigma.positions() == expected
+
+    with pytest.raises(ValueError):
+        enigma.advance(-1)
+
+
 @pytest.mark.parametrize(
     "model, n_rotors, should_fail",
     (